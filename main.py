@@ -1,12 +1,47 @@
 import uuid
 import json
+import zlib
 import os
-import requests
-from datetime import datetime
-from anthropic import Anthropic
+import contextlib
+import contextvars
+import functools
+import gzip
+import hashlib
+import importlib
+import math
+import mmap
+import random
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
 
-# Initialize Claude client
-client = Anthropic()
+
+class LazyModule:
+    """Stand-in for a heavy module that is imported on first attribute access
+    
+    Keeps requests and the Anthropic SDK (together most of the import time) off the startup path
+    of workers that only parse webhooks or aggregate stored results.
+    """
+    
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+    
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+requests = LazyModule('requests')
+anthropic = LazyModule('anthropic')
 
 # API Keys (loaded from environment variables)
 BRAND_DEV_API_KEY = os.environ.get("BRAND_DEV_API_KEY", "")
@@ -16,100 +51,1771 @@ PERPLEXITY_API_KEY = os.environ.get("PERPLEXITY_API_KEY", "")
 AIRTABLE_API_KEY = os.environ.get("AIRTABLE_API_KEY", "")
 AIRTABLE_BASE_ID = os.environ.get("AIRTABLE_BASE_ID", "appgSZR92pGCMlUOc")
 
+# API base URLs (overridable to point at local stand-ins, e.g. scripts/benchmark_pipeline.py;
+# the Anthropic SDK reads ANTHROPIC_BASE_URL itself)
+OPENAI_API_BASE = os.environ.get("OPENAI_API_BASE", "https://api.openai.com/v1")
+GEMINI_API_BASE = os.environ.get("GEMINI_API_BASE", "https://generativelanguage.googleapis.com/v1beta")
+PERPLEXITY_API_BASE = os.environ.get("PERPLEXITY_API_BASE", "https://api.perplexity.ai")
+BRAND_DEV_API_BASE = os.environ.get("BRAND_DEV_API_BASE", "https://api.brand.dev/v1")
+AIRTABLE_API_BASE = os.environ.get("AIRTABLE_API_BASE", "https://api.airtable.com/v0")
+
+# HTTP transport: pooled keep-alive connections per host
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", "20"))
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", "10"))
+HTTP_READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", "120"))
+HTTP2_ENABLED = os.environ.get("HTTP2_ENABLED", "").lower() in ("1", "true", "yes")
+
+# Rate limits: requests/tokens per minute per provider (0 = unlimited), retries with jittered backoff.
+# These are totals for the deployment: `serve` splits them evenly across its INGEST_WORKERS processes.
+RATE_LIMITS = {
+    'chatgpt': {'rpm': int(os.environ.get("CHATGPT_RPM", "500")), 'tpm': int(os.environ.get("CHATGPT_TPM", "30000"))},
+    'claude': {'rpm': int(os.environ.get("CLAUDE_RPM", "50")), 'tpm': int(os.environ.get("CLAUDE_TPM", "40000"))},
+    'gemini': {'rpm': int(os.environ.get("GEMINI_RPM", "360")), 'tpm': int(os.environ.get("GEMINI_TPM", "0"))},
+    'perplexity': {'rpm': int(os.environ.get("PERPLEXITY_RPM", "50")), 'tpm': int(os.environ.get("PERPLEXITY_TPM", "0"))},
+    # Airtable allows 5 requests/second per base
+    'airtable': {'rpm': int(os.environ.get("AIRTABLE_RPM", "300")), 'tpm': 0}
+}
+MAX_RETRIES = int(os.environ.get("PROVIDER_MAX_RETRIES", "5"))
+RETRY_BASE_DELAY = float(os.environ.get("RETRY_BASE_DELAY", "1"))
+RETRY_MAX_DELAY = float(os.environ.get("RETRY_MAX_DELAY", "60"))
+
+# Tail latency: once a provider has LATENCY_MIN_SAMPLES successful requests, its request timeout becomes
+# TIMEOUT_P99_MULTIPLIER x its p99 (between TIMEOUT_FLOOR and HTTP_READ_TIMEOUT). With HEDGE_ENABLED a
+# duplicate call goes out when the first has not answered by the provider's HEDGE_PERCENTILE latency.
+# After CIRCUIT_FAILURE_THRESHOLD consecutive failures (0 = never) a provider is not called for
+# CIRCUIT_COOLDOWN seconds and its platform is reported unavailable.
+ADAPTIVE_TIMEOUTS = os.environ.get("ADAPTIVE_TIMEOUTS", "true").lower() in ("1", "true", "yes")
+LATENCY_MIN_SAMPLES = int(os.environ.get("LATENCY_MIN_SAMPLES", "20"))
+TIMEOUT_P99_MULTIPLIER = float(os.environ.get("TIMEOUT_P99_MULTIPLIER", "3"))
+TIMEOUT_FLOOR = float(os.environ.get("TIMEOUT_FLOOR", "15"))
+HEDGE_ENABLED = os.environ.get("HEDGE_ENABLED", "").lower() in ("1", "true", "yes")
+HEDGE_PERCENTILE = float(os.environ.get("HEDGE_PERCENTILE", "95"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_COOLDOWN = float(os.environ.get("CIRCUIT_COOLDOWN", "60"))
+
+# Instrumentation: stage timing spans, request latency histograms, token usage, cost and retries.
+# Events are appended to METRICS_LOG_PATH as JSON lines (empty disables the log). Worker processes
+# snapshot their totals into METRICS_DIR, which the ingest server merges and serves at /metrics.
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+METRICS_LOG_PATH = os.environ.get("METRICS_LOG_PATH", ".cache/metrics.jsonl")
+METRICS_DIR = os.environ.get("METRICS_DIR", ".cache/metrics")
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+# Cost estimate: USD per million (input, output) tokens; MODEL_PRICES_JSON overrides or adds models
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "claude-sonnet-4-20250514": (3.00, 15.00),
+    "gemini-1.5-flash": (0.075, 0.30),
+    "llama-3.1-sonar-large-128k-online": (1.00, 1.00),
+}
+MODEL_PRICES.update({m: tuple(p) for m, p in json.loads(os.environ.get("MODEL_PRICES_JSON", "{}")).items()})
+
+PLATFORMS = ['chatgpt', 'claude', 'gemini', 'perplexity']
+PLATFORM_NAMES = {'chatgpt': 'ChatGPT', 'claude': 'Claude', 'gemini': 'Gemini', 'perplexity': 'Perplexity'}
+SCORE_FIELDS = ['mention', 'position', 'sentiment', 'recommendation', 'message_alignment', 'overall']
+
+# Provider models and request parameters (also part of the response cache key)
+CHATGPT_MODEL = "gpt-4o"
+CHATGPT_PARAMS = {"max_tokens": 2048}
+CLAUDE_MODEL = "claude-sonnet-4-20250514"
+CLAUDE_PARAMS = {"max_tokens": 2048}
+GEMINI_MODEL = "gemini-1.5-flash"
+GEMINI_PARAMS = {}
+PERPLEXITY_MODEL = "llama-3.1-sonar-large-128k-online"
+PERPLEXITY_PARAMS = {}
+ANALYSIS_MODEL = "claude-sonnet-4-20250514"
+
+# Analysis batching: questions scored per Claude call (1 = one call per question).
+# ANALYSIS_OFFLINE swaps Claude for a local stand-in that returns zero scores (for tests).
+ANALYSIS_BATCH_SIZE = int(os.environ.get("ANALYSIS_BATCH_SIZE", "4"))
+ANALYSIS_MAX_TOKENS_PER_QUESTION = int(os.environ.get("ANALYSIS_MAX_TOKENS_PER_QUESTION", "1200"))
+ANALYSIS_OFFLINE = os.environ.get("ANALYSIS_OFFLINE", "").lower() in ("1", "true", "yes")
+# Follow-up calls allowed for platform blocks still missing or invalid after local JSON repair
+ANALYSIS_REPAIR_ATTEMPTS = int(os.environ.get("ANALYSIS_REPAIR_ATTEMPTS", "1"))
+
+# Analysis prompt size. ANALYSIS_PROMPT_CACHE (off by default) sends the rubric and brand context as a
+# cached system prefix (Anthropic prompt caching). The API only caches a prefix of at least
+# ANALYSIS_CACHE_MIN_TOKENS (1024 for Sonnet) and the usual prefix is ~200 tokens, so it saves nothing
+# for typical runs; shorter prefixes are sent inline either way.
+# ANALYSIS_TRIM_ENABLED sends only the passages within ANALYSIS_TRIM_WINDOW characters of a brand or
+# competitor mention instead of whole responses.
+ANALYSIS_PROMPT_CACHE = os.environ.get("ANALYSIS_PROMPT_CACHE", "").lower() in ("1", "true", "yes")
+ANALYSIS_CACHE_MIN_TOKENS = int(os.environ.get("ANALYSIS_CACHE_MIN_TOKENS", "1024"))
+ANALYSIS_TRIM_ENABLED = os.environ.get("ANALYSIS_TRIM_ENABLED", "").lower() in ("1", "true", "yes")
+ANALYSIS_TRIM_WINDOW = int(os.environ.get("ANALYSIS_TRIM_WINDOW", "400"))
+
+# Local pre-scoring: platforms whose response never names the brand are scored locally, not by Claude
+LOCAL_PRESCORE_ENABLED = os.environ.get("LOCAL_PRESCORE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Provider response cache (SQLite on disk, TTL in seconds, LRU-evicted above max entries)
+CACHE_PATH = os.environ.get("TRACKER_CACHE_PATH", ".cache/tracker_cache.sqlite3")
+RESPONSE_CACHE_ENABLED = os.environ.get("RESPONSE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+RESPONSE_CACHE_TTL = int(os.environ.get("RESPONSE_CACHE_TTL", "86400"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", "50000"))
+BRAND_CACHE_TTL = int(os.environ.get("BRAND_CACHE_TTL", "604800"))
+INDUSTRY_CACHE_TTL = int(os.environ.get("INDUSTRY_CACHE_TTL", "604800"))
+
+# Request coalescing: identical provider queries in flight at once (across concurrent runs in this
+# process) share one upstream call and its result
+REQUEST_COALESCING_ENABLED = os.environ.get("REQUEST_COALESCING_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Run journal: append-only record of each run's completed work, replayed when resuming
+RUN_JOURNAL_ENABLED = os.environ.get("RUN_JOURNAL_ENABLED", "true").lower() in ("1", "true", "yes")
+RUN_JOURNAL_DIR = os.environ.get("RUN_JOURNAL_DIR", ".cache/journals")
+
+# Raw response blob store: content-addressed, compressed (zstd when installed, else gzip).
+# AIRTABLE_RESPONSE_REFS writes blob refs instead of full text to the *_response fields; the
+# dashboard reads those fields, so leave it off unless another reader resolves the refs.
+BLOB_STORE_ENABLED = os.environ.get("BLOB_STORE_ENABLED", "true").lower() in ("1", "true", "yes")
+BLOB_STORE_DIR = os.environ.get("BLOB_STORE_DIR", ".cache/blobs")
+BLOB_STORE_MMAP = os.environ.get("BLOB_STORE_MMAP", "").lower() in ("1", "true", "yes")
+# Blob retention: after a run (at most every BLOB_STORE_SWEEP_INTERVAL seconds per process), blobs not
+# written for BLOB_STORE_TTL seconds are deleted, then the oldest until the store fits BLOB_STORE_MAX_MB
+# (0 disables either bound). Blobs referenced by the journal of an unfinished run are always kept.
+# A finished run's journal is deleted; one not written for BLOB_STORE_TTL is pruned by the sweep.
+# With AIRTABLE_RESPONSE_REFS, keep the TTL at least as long as readers need to resolve the refs.
+BLOB_STORE_TTL = int(os.environ.get("BLOB_STORE_TTL", "2592000"))
+BLOB_STORE_MAX_MB = float(os.environ.get("BLOB_STORE_MAX_MB", "0"))
+BLOB_STORE_SWEEP_INTERVAL = float(os.environ.get("BLOB_STORE_SWEEP_INTERVAL", "3600"))
+AIRTABLE_RESPONSE_REFS = os.environ.get("AIRTABLE_RESPONSE_REFS", "").lower() in ("1", "true", "yes")
+
+# Score history: local SQLite time series of each run's aggregates, used for the dashboard's
+# history_json (last HISTORY_POINTS runs), per-platform trends (change of at least TREND_THRESHOLD
+# points since the previous run) and deltas against the previous run and HISTORY_PERIOD_DAYS ago
+HISTORY_ENABLED = os.environ.get("HISTORY_ENABLED", "true").lower() in ("1", "true", "yes")
+HISTORY_PATH = os.environ.get("TRACKER_HISTORY_PATH", ".cache/history.sqlite3")
+HISTORY_POINTS = int(os.environ.get("HISTORY_POINTS", "12"))
+HISTORY_PERIOD_DAYS = int(os.environ.get("HISTORY_PERIOD_DAYS", "30"))
+TREND_THRESHOLD = float(os.environ.get("TREND_THRESHOLD", "2"))
+
+# Webhook ingestion service: durable SQLite job queue drained by worker processes
+INGEST_HOST = os.environ.get("INGEST_HOST", "127.0.0.1")
+INGEST_PORT = int(os.environ.get("INGEST_PORT", "8080"))
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", "2"))
+INGEST_RUNS_PER_WORKER = int(os.environ.get("INGEST_RUNS_PER_WORKER", "2"))
+QUEUE_PATH = os.environ.get("QUEUE_PATH", ".cache/job_queue.sqlite3")
+QUEUE_MAX_DEPTH = int(os.environ.get("QUEUE_MAX_DEPTH", "200"))
+QUEUE_POLL_INTERVAL = float(os.environ.get("QUEUE_POLL_INTERVAL", "1"))
+# Attempts per job: a run that raised, whose Airtable writes partly failed or whose worker died is
+# requeued (and resumed from its journal) until it has been tried this many times, then marked failed
+QUEUE_MAX_ATTEMPTS = int(os.environ.get("QUEUE_MAX_ATTEMPTS", "3"))
+# How often `serve` checks its worker processes, restarting dead ones and requeueing their jobs
+QUEUE_SUPERVISE_INTERVAL = float(os.environ.get("QUEUE_SUPERVISE_INTERVAL", "5"))
+
+# Tracker concurrency: questions in flight at once, and max concurrent calls per provider
+QUESTION_CONCURRENCY = int(os.environ.get("TRACKER_QUESTION_CONCURRENCY", "5"))
+PROVIDER_CONCURRENCY = {
+    p: int(os.environ.get(f"TRACKER_{p.upper()}_CONCURRENCY", "4")) for p in PLATFORMS
+}
+
+# Multi-sample querying: with SAMPLING_ENABLED each (question, provider) pair is asked SAMPLE_MIN times
+# at once, then SAMPLE_BATCH more at a time until the Wilson interval of its mention rate (at
+# SAMPLE_CONFIDENCE) is at most SAMPLE_CI_WIDTH wide, or SAMPLE_MAX answers are in. Only the first
+# sample is scored by Claude; the mention score becomes the sampled mention rate.
+SAMPLING_ENABLED = os.environ.get("SAMPLING_ENABLED", "").lower() in ("1", "true", "yes")
+SAMPLE_MIN = int(os.environ.get("SAMPLE_MIN", "3"))
+SAMPLE_MAX = int(os.environ.get("SAMPLE_MAX", "10"))
+SAMPLE_BATCH = int(os.environ.get("SAMPLE_BATCH", "2"))
+SAMPLE_CI_WIDTH = float(os.environ.get("SAMPLE_CI_WIDTH", "0.4"))
+SAMPLE_CONFIDENCE = float(os.environ.get("SAMPLE_CONFIDENCE", "0.95"))
+
+
+_http_sessions = {}
+_http_sessions_lock = threading.Lock()
+
+
+def _new_http_session():
+    """Build a keep-alive session: httpx with HTTP/2 when enabled and installed, else requests"""
+    if HTTP2_ENABLED:
+        try:
+            import httpx
+            return httpx.Client(
+                http2=True,
+                timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+                limits=httpx.Limits(max_connections=HTTP_POOL_SIZE, max_keepalive_connections=HTTP_POOL_SIZE)
+            )
+        except ImportError:
+            print("HTTP/2 requested but httpx[http2] is not installed, falling back to HTTP/1.1")
+    
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_http_session(url: str):
+    """Return the shared pooled session for the URL's host, creating it on first use"""
+    host = urlsplit(url).netloc
+    with _http_sessions_lock:
+        session = _http_sessions.get(host)
+        if session is None:
+            session = _new_http_session()
+            _http_sessions[host] = session
+        return session
+
+
+def http_request(method: str, url: str, read_timeout: float = None, **kwargs):
+    """Send a request over the host's pooled session with the configured (or given read) timeout"""
+    session = get_http_session(url)
+    read_timeout = read_timeout or HTTP_READ_TIMEOUT
+    if isinstance(session, requests.Session):
+        kwargs.setdefault('timeout', (HTTP_CONNECT_TIMEOUT, read_timeout))
+        return session.request(method, url, **kwargs)
+    
+    import httpx
+    kwargs.setdefault('timeout', httpx.Timeout(read_timeout, connect=HTTP_CONNECT_TIMEOUT))
+    try:
+        return session.request(method, url, **kwargs)
+    except httpx.TransportError as e:
+        # Surface transport failures the same way for both clients
+        raise requests.ConnectionError(str(e)) from e
+
+
+def http_post(url: str, **kwargs):
+    return http_request('POST', url, **kwargs)
+
+
+def http_get(url: str, **kwargs):
+    return http_request('GET', url, **kwargs)
+
+
+_current_run = contextvars.ContextVar('current_run', default=None)
+
+
+class ContextThreadPool(ThreadPoolExecutor):
+    """Thread pool whose tasks run in the submitter's context, so per-run metrics follow the work"""
+    
+    def submit(self, fn, *args, **kwargs):
+        return super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def _metric_key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _prometheus_labels(labels, extra: str = '') -> str:
+    parts = [f'{k}="{v}"' for k, v in labels] + ([extra] if extra else [])
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def render_prometheus(counters: dict, histograms: dict) -> str:
+    """Prometheus text exposition of {(name, labels): value} counters and latency histograms"""
+    lines = []
+    for name in sorted({n for n, _ in counters}):
+        lines.append(f"# TYPE {name} counter")
+        for (n, labels), value in sorted(counters.items()):
+            if n == name:
+                lines.append(f"{name}{_prometheus_labels(labels)} {value:g}")
+    for name in sorted({n for n, _ in histograms}):
+        lines.append(f"# TYPE {name} histogram")
+        for (n, labels), hist in sorted(histograms.items()):
+            if n != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(list(LATENCY_BUCKETS) + ['+Inf'], hist['buckets']):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{name}_bucket{_prometheus_labels(labels, le)} {cumulative}")
+            lines.append(f"{name}_sum{_prometheus_labels(labels)} {hist['sum']:.6f}")
+            lines.append(f"{name}_count{_prometheus_labels(labels)} {hist['count']}")
+    return '\n'.join(lines) + '\n'
+
+
+class Metrics:
+    """Process-wide counters and latency histograms, per-run totals, and a JSON-lines event log
+    
+    Stage spans, provider requests, token usage (with estimated cost) and retries are recorded here.
+    Inside `run_scope(run_id)` every counter is also added to that run's totals, which are logged
+    as a 'run' event when the scope ends.
+    """
+    
+    def __init__(self, log_path: str = METRICS_LOG_PATH, enabled: bool = METRICS_ENABLED):
+        self.enabled = enabled
+        self.log_path = log_path
+        self.counters = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+        self._log_lock = threading.Lock()
+        self._log_dir_ready = False
+    
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        if not self.enabled:
+            return
+        key = _metric_key(name, labels)
+        run = _current_run.get()
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+            if run is not None:
+                run['counters'][key] = run['counters'].get(key, 0) + value
+    
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        if not self.enabled:
+            return
+        key = _metric_key(name, labels)
+        slot = next((i for i, bound in enumerate(LATENCY_BUCKETS) if seconds <= bound), len(LATENCY_BUCKETS))
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = {'buckets': [0] * (len(LATENCY_BUCKETS) + 1), 'sum': 0.0, 'count': 0}
+            hist['buckets'][slot] += 1
+            hist['sum'] += seconds
+            hist['count'] += 1
+    
+    def emit(self, event: dict) -> None:
+        """Append one event to the JSON-lines log, tagged with the time and the current run"""
+        if not (self.enabled and self.log_path):
+            return
+        run = _current_run.get()
+        line = json.dumps({'ts': round(time.time(), 3), 'run_id': run['run_id'] if run else None, **event})
+        with self._log_lock:
+            if not self._log_dir_ready and os.path.dirname(self.log_path):
+                os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+            self._log_dir_ready = True
+            with open(self.log_path, 'a') as f:
+                f.write(line + '\n')
+    
+    @contextlib.contextmanager
+    def span(self, stage: str):
+        """Time a pipeline stage into tracker_stage_seconds and log it"""
+        start = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            seconds = time.perf_counter() - start
+            self.observe('tracker_stage_seconds', seconds, stage=stage)
+            self.inc('tracker_stage_seconds_total', seconds, stage=stage)
+            self.emit({'event': 'span', 'stage': stage, 'seconds': round(seconds, 4), 'ok': ok})
+    
+    def request(self, provider: str, seconds: float, status) -> None:
+        """One upstream HTTP request (each retry attempt counts separately)"""
+        self.observe('tracker_request_seconds', seconds, provider=provider)
+        self.inc('tracker_requests_total', provider=provider, status=status)
+    
+    def usage(self, provider: str, model: str, input_tokens: int, output_tokens: int,
+              cache_read_tokens: int = 0, cache_write_tokens: int = 0) -> None:
+        """Token counts from an API response, and their estimated cost
+        
+        Prompt-cache reads are billed at a tenth of the input price and cache writes at 1.25x.
+        """
+        input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+        input_tokens, output_tokens = input_tokens or 0, output_tokens or 0
+        cache_read_tokens, cache_write_tokens = cache_read_tokens or 0, cache_write_tokens or 0
+        self.inc('tracker_input_tokens_total', input_tokens, provider=provider, model=model)
+        self.inc('tracker_output_tokens_total', output_tokens, provider=provider, model=model)
+        if cache_read_tokens or cache_write_tokens:
+            self.inc('tracker_cache_read_tokens_total', cache_read_tokens, provider=provider, model=model)
+            self.inc('tracker_cache_write_tokens_total', cache_write_tokens, provider=provider, model=model)
+        cost = (input_tokens * input_price + output_tokens * output_price
+                + cache_read_tokens * input_price * 0.1 + cache_write_tokens * input_price * 1.25) / 1e6
+        self.inc('tracker_cost_usd_total', cost, provider=provider, model=model)
+    
+    @contextlib.contextmanager
+    def run_scope(self, run_id: str):
+        """Attribute everything recorded in this context (and pools it submits to) to one run"""
+        run = {'run_id': run_id, 'started': time.perf_counter(), 'counters': {}, 'summary': None}
+        token = _current_run.set(run)
+        try:
+            yield run
+        finally:
+            run['summary'] = self.run_summary(run)
+            self.emit({'event': 'run', **run['summary']})
+            _current_run.reset(token)
+    
+    def run_summary(self, run: dict) -> dict:
+        summary = {'seconds': round(time.perf_counter() - run['started'], 3), 'stages': {}, 'requests': {},
+                   'retries': {}, 'input_tokens': {}, 'output_tokens': {}, 'cache_read_tokens': {},
+                   'cache_write_tokens': {}, 'trimmed_tokens': 0, 'samples': {}, 'samples_saved': {},
+                   'cost_usd': 0.0}
+        with self._lock:
+            counters = list(run['counters'].items())
+        for (name, labels), value in counters:
+            labels = dict(labels)
+            if name == 'tracker_stage_seconds_total':
+                summary['stages'][labels['stage']] = round(value, 3)
+            elif name == 'tracker_requests_total':
+                summary['requests'][labels['provider']] = summary['requests'].get(labels['provider'], 0) + value
+            elif name == 'tracker_retries_total':
+                summary['retries'][labels['provider']] = value
+            elif name in ('tracker_input_tokens_total', 'tracker_output_tokens_total',
+                          'tracker_cache_read_tokens_total', 'tracker_cache_write_tokens_total'):
+                totals = summary[name[len('tracker_'):-len('_total')]]
+                totals[labels['provider']] = totals.get(labels['provider'], 0) + value
+            elif name == 'tracker_trimmed_tokens_total':
+                summary['trimmed_tokens'] += value
+            elif name in ('tracker_samples_total', 'tracker_samples_saved_total'):
+                summary[name[len('tracker_'):-len('_total')]][labels['provider']] = value
+            elif name == 'tracker_cost_usd_total':
+                summary['cost_usd'] += value
+        summary['cost_usd'] = round(summary['cost_usd'], 6)
+        return summary
+    
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {'counters': [[n, list(l), v] for (n, l), v in self.counters.items()],
+                    'histograms': [[n, list(l), dict(h, buckets=list(h['buckets']))] for (n, l), h in self.histograms.items()]}
+    
+    def prometheus(self) -> str:
+        with self._lock:
+            return render_prometheus(dict(self.counters), {k: dict(h) for k, h in self.histograms.items()})
+    
+    def dump(self, directory: str = METRICS_DIR) -> None:
+        """Write this process's totals to <directory>/<pid>.json for the ingest server to merge"""
+        if not self.enabled:
+            return
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{os.getpid()}.json")
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(path + '.tmp', path)
+
+
+def merged_prometheus(directory: str = METRICS_DIR) -> str:
+    """Sum the snapshots every worker process dumped and render them as Prometheus text"""
+    counters, histograms = {}, {}
+    names = sorted(os.listdir(directory)) if os.path.isdir(directory) else []
+    for name in names:
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for n, labels, value in snapshot['counters']:
+            key = (n, tuple(tuple(pair) for pair in labels))
+            counters[key] = counters.get(key, 0) + value
+        for n, labels, hist in snapshot['histograms']:
+            key = (n, tuple(tuple(pair) for pair in labels))
+            merged = histograms.setdefault(key, {'buckets': [0] * (len(LATENCY_BUCKETS) + 1), 'sum': 0.0, 'count': 0})
+            merged['buckets'] = [a + b for a, b in zip(merged['buckets'], hist['buckets'])]
+            merged['sum'] += hist['sum']
+            merged['count'] += hist['count']
+    return render_prometheus(counters, histograms)
+
+
+metrics = Metrics()
+
+
+class SQLiteCache:
+    """Disk-backed JSON key/value cache with a TTL, size-bounded LRU eviction and hit/miss counters"""
+    
+    def __init__(self, path: str, table: str, ttl: int, max_entries: int):
+        self.path = path
+        self.table = table
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._evict_every = max(1, min(64, max_entries // 16))
+        self._conn = None
+        self._lock = threading.Lock()
+    
+    def _connect(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {self.table} "
+                         "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_accessed_at ON {self.table} (accessed_at)")
+            self._conn = conn
+        return self._conn
+    
+    def get(self, key: str):
+        """Return the cached value, or None when missing or expired"""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                self.misses += 1
+                if row is not None:
+                    conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                return None
+            conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(row[0])
+    
+    def set(self, key: str, value) -> None:
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(f"INSERT OR REPLACE INTO {self.table} (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                         (key, json.dumps(value), now, now))
+            self._writes += 1
+            if self._writes % self._evict_every == 0:
+                self._evict(conn, now)
+    
+    def _evict(self, conn, now: float) -> None:
+        conn.execute(f"DELETE FROM {self.table} WHERE created_at < ?", (now - self.ttl,))
+        conn.execute(f"DELETE FROM {self.table} WHERE key IN "
+                     f"(SELECT key FROM {self.table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+    
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._connect().execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._connect().execute(f"DELETE FROM {self.table}")
+    
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._connect().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups * 100, 1) if lookups else 0,
+            'entries': entries
+        }
+
+
+response_cache = SQLiteCache(CACHE_PATH, "provider_responses", RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_ENTRIES)
+brand_cache = SQLiteCache(CACHE_PATH, "brand_assets", BRAND_CACHE_TTL, 10000)
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one execution whose result all callers share
+    
+    Every call counts towards singleflight_calls and every caller served by another's execution
+    towards singleflight_coalesced, both labelled with `provider`.
+    """
+    
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.leaders = 0
+        self.followers = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+    
+    def do(self, key, fn, *args):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = Future()
+                self._calls[key] = call
+                self.leaders += 1
+            else:
+                self.followers += 1
+        metrics.inc('singleflight_calls', provider=self.provider)
+        if not leader:
+            metrics.inc('singleflight_coalesced', provider=self.provider)
+            return call.result()
+        
+        try:
+            result = fn(*args)
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+brand_flights = SingleFlight('brand_dev')
+industry_cache = SQLiteCache(CACHE_PATH, "industry", INDUSTRY_CACHE_TTL, 10000)
+industry_flights = SingleFlight('industry')
+provider_flights = {p: SingleFlight(p) for p in PLATFORMS}
+_provider_slots = {p: threading.BoundedSemaphore(max(1, n)) for p, n in PROVIDER_CONCURRENCY.items()}
+_hedge_pool = ContextThreadPool(max_workers=sum(max(1, n) for n in PROVIDER_CONCURRENCY.values()))
+
+
+def normalize_question(question: str) -> str:
+    return ' '.join(question.lower().split())
 
-def save_to_airtable(results: list, session_id: str, table_name: str = "Raw Question Data") -> list:
-    """Save tracker results to Airtable (Steps 22-24)"""
+
+def response_cache_key(provider: str, model: str, params: dict, question: str, sample: int = 0) -> str:
+    """Cache (and coalescing) key; repeat samples of a question get their own keys, sample 0 the plain one"""
+    parts = [provider, model, params, normalize_question(question)]
+    if sample:
+        parts.append(sample)
+    raw = json.dumps(parts, sort_keys=True)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def cached_response(provider: str, model: str, params: dict):
+    """Serve a provider query from the response cache, coalescing identical in-flight queries.
+    
+    A cache miss goes upstream through guarded_call (circuit breaker, concurrency slot, hedging);
+    error responses are shared with callers already waiting on the call but never cached.
+    `sample` selects an independent draw of the same question (multi-sample querying).
+    """
+    def decorator(query_fn):
+        @functools.wraps(query_fn)
+        def wrapper(question: str, sample: int = 0) -> str:
+            key = response_cache_key(provider, model, params, question, sample)
+            if RESPONSE_CACHE_ENABLED:
+                cached = response_cache.get(key)
+                if cached is not None:
+                    return cached
+            
+            def fetch():
+                answer = guarded_call(provider, query_fn, question)
+                if RESPONSE_CACHE_ENABLED and not is_error_response(answer):
+                    response_cache.set(key, answer)
+                return answer
+            
+            if not REQUEST_COALESCING_ENABLED:
+                return fetch()
+            return provider_flights[provider].do(key, fetch)
+        return wrapper
+    return decorator
+
+
+def coalescing_stats() -> dict:
+    """Upstream calls vs. coalesced callers per provider since process start"""
+    stats = {}
+    for provider, flights in provider_flights.items():
+        total = flights.leaders + flights.followers
+        stats[provider] = {
+            'upstream_calls': flights.leaders,
+            'coalesced': flights.followers,
+            'coalescing_rate': round(flights.followers / total, 4) if total else 0.0
+        }
+    return stats
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at `rate` tokens/second up to `capacity`"""
+    
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+    
+    def acquire(self, amount: float = 1.0) -> None:
+        # A request bigger than the bucket only waits for a full bucket, never forever
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                wait = self.blocked_until - now
+                if wait <= 0:
+                    if self.tokens >= amount:
+                        self.tokens -= amount
+                        return
+                    wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+    
+    def block_for(self, seconds: float) -> None:
+        """Hold every caller back for `seconds` (provider said the quota is exhausted)"""
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+
+def _parse_reset(value: str):
+    """Parse a rate-limit reset header into seconds: '20ms', '1m30s', '12', or an ISO/HTTP date"""
+    value = (value or '').strip()
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parts = re.findall(r'(\d+(?:\.\d+)?)(ms|s|m|h)', value)
+    if parts and ''.join(n + u for n, u in parts) == value:
+        scale = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+        return sum(float(n) * scale[u] for n, u in parts)
+    try:
+        reset_at = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        try:
+            from email.utils import parsedate_to_datetime
+            reset_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+    if reset_at.tzinfo is None:
+        reset_at = reset_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (reset_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class RateLimitScheduler:
+    """Per-provider request/token buckets driven by configured limits and rate-limit response headers
+    
+    Buckets live in one process; with `share` processes drawing on the same quotas, each gets
+    1/share of every limit.
+    """
+    
+    def __init__(self, limits: dict, share: int = 1):
+        self.request_buckets = {}
+        self.token_buckets = {}
+        share = max(1, share)
+        for provider, limit in limits.items():
+            if limit.get('rpm'):
+                rate = limit['rpm'] / share / 60.0
+                self.request_buckets[provider] = TokenBucket(rate, capacity=rate)
+            if limit.get('tpm'):
+                tpm = limit['tpm'] / share
+                self.token_buckets[provider] = TokenBucket(tpm / 60.0, capacity=tpm)
+        self.retries = {provider: 0 for provider in limits}
+        self._lock = threading.Lock()
+    
+    def acquire(self, provider: str, tokens: int = 0) -> None:
+        if provider in self.request_buckets:
+            self.request_buckets[provider].acquire(1)
+        if tokens and provider in self.token_buckets:
+            self.token_buckets[provider].acquire(tokens)
+    
+    def pause(self, provider: str, seconds: float) -> None:
+        for buckets in (self.request_buckets, self.token_buckets):
+            if provider in buckets:
+                buckets[provider].block_for(seconds)
+    
+    def observe(self, provider: str, headers) -> None:
+        """Pause a provider whose rate-limit headers report an exhausted quota until it resets"""
+        for kind in ('requests', 'tokens'):
+            remaining = headers.get(f'x-ratelimit-remaining-{kind}') or headers.get(f'anthropic-ratelimit-{kind}-remaining')
+            if remaining is None or remaining.strip() not in ('0', '0.0'):
+                continue
+            reset = _parse_reset(headers.get(f'x-ratelimit-reset-{kind}') or headers.get(f'anthropic-ratelimit-{kind}-reset'))
+            if reset:
+                self.pause(provider, reset)
+    
+    def record_retry(self, provider: str) -> None:
+        with self._lock:
+            self.retries[provider] = self.retries.get(provider, 0) + 1
+        metrics.inc('tracker_retries_total', provider=provider)
+
+
+rate_limiter = RateLimitScheduler(RATE_LIMITS)
+
+
+class LatencyTracker:
+    """Recent successful request latencies for one provider, for adaptive timeouts and hedging"""
+    
+    def __init__(self, window: int = 500):
+        self.samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+    
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self.samples.append(seconds)
+    
+    def percentile(self, pct: float):
+        """Nearest-rank percentile, or None until LATENCY_MIN_SAMPLES have been seen"""
+        with self._lock:
+            samples = sorted(self.samples)
+        if len(samples) < max(1, LATENCY_MIN_SAMPLES):
+            return None
+        return samples[max(0, int(-(-len(samples) * pct // 100)) - 1)]
+    
+    def timeout(self) -> float:
+        p99 = self.percentile(99) if ADAPTIVE_TIMEOUTS else None
+        if p99 is None:
+            return HTTP_READ_TIMEOUT
+        return min(HTTP_READ_TIMEOUT, max(TIMEOUT_FLOOR, p99 * TIMEOUT_P99_MULTIPLIER))
+
+
+class CircuitBreaker:
+    """Stop calling a provider after consecutive failures; let one probe through after the cooldown"""
+    
+    def __init__(self, provider: str, threshold: int = CIRCUIT_FAILURE_THRESHOLD, cooldown: float = CIRCUIT_COOLDOWN):
+        self.provider = provider
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+    
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        return 'half_open' if time.monotonic() - self.opened_at >= self.cooldown else 'open'
+    
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.cooldown and not self._probing:
+                self._probing = True
+                return True
+            return False
+    
+    def record(self, ok: bool) -> None:
+        with self._lock:
+            self._probing = False
+            if ok:
+                if self.opened_at is not None:
+                    print(f"{PLATFORM_NAMES.get(self.provider, self.provider)} recovered, circuit closed")
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.threshold and self.failures >= self.threshold:
+                if self.opened_at is None:
+                    print(f"{PLATFORM_NAMES.get(self.provider, self.provider)} failed {self.failures} times in a row, "
+                          f"circuit open for {self.cooldown:g}s")
+                    metrics.inc('tracker_circuit_opened_total', provider=self.provider)
+                self.opened_at = time.monotonic()
+
+
+UNAVAILABLE_PREFIX = 'Unavailable:'
+provider_latency = {p: LatencyTracker() for p in PLATFORMS}
+circuit_breakers = {p: CircuitBreaker(p) for p in PLATFORMS}
+
+
+def provider_timeout(provider: str) -> float:
+    return provider_latency[provider].timeout()
+
+
+def record_latency(provider: str, seconds: float) -> None:
+    if provider in provider_latency:
+        provider_latency[provider].add(seconds)
+
+
+def _run_in_slot(provider: str, query_fn, question: str) -> str:
+    try:
+        return query_fn(question)
+    finally:
+        _provider_slots[provider].release()
+
+
+def hedged_call(provider: str, query_fn, question: str) -> str:
+    """Call a provider in one of its concurrency slots; with HEDGE_ENABLED, race a duplicate call
+    (if a slot is free) when the first has not answered by the provider's HEDGE_PERCENTILE latency"""
+    slots = _provider_slots[provider]
+    delay = provider_latency[provider].percentile(HEDGE_PERCENTILE) if HEDGE_ENABLED else None
+    if delay is None:
+        with slots:
+            return query_fn(question)
+    
+    slots.acquire()
+    calls = [_hedge_pool.submit(_run_in_slot, provider, query_fn, question)]
+    done, _ = wait(calls, timeout=delay)
+    if not done and slots.acquire(blocking=False):
+        calls.append(_hedge_pool.submit(_run_in_slot, provider, query_fn, question))
+        metrics.inc('tracker_hedged_requests_total', provider=provider)
+    
+    # First good answer wins; the slower call finishes in the background and frees its slot. A call
+    # that raised or answered with an error only loses the race, so the other can still answer.
+    pending, answer, error = set(calls), None, None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for call in done:
+            try:
+                answer = call.result()
+            except Exception as e:
+                error = e
+                continue
+            if not is_error_response(answer):
+                if call is not calls[0]:
+                    metrics.inc('tracker_hedge_wins_total', provider=provider)
+                return answer
+    if answer is None:
+        raise error
+    return answer
+
+
+def guarded_call(provider: str, query_fn, question: str) -> str:
+    """Call a provider behind its circuit breaker; an open circuit returns an Unavailable placeholder"""
+    breaker = circuit_breakers[provider]
+    if not breaker.allow():
+        metrics.inc('tracker_circuit_rejected_total', provider=provider)
+        return f"{UNAVAILABLE_PREFIX} {PLATFORM_NAMES[provider]} circuit open"
+    try:
+        answer = hedged_call(provider, query_fn, question)
+    except Exception:
+        # A raising call is a failure too; otherwise a failed half-open probe would never be cleared
+        breaker.record(False)
+        raise
+    breaker.record(not is_error_response(answer))
+    return answer
+
+
+def backoff_delay(attempt: int, retry_after=None) -> float:
+    """Retry-After when the server sent one, else full-jitter exponential backoff"""
+    if retry_after is not None:
+        return min(retry_after, RETRY_MAX_DELAY)
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt)))
+
+
+def send_with_retry(provider: str, method: str, url: str, tokens: int = 0, **kwargs):
+    """Send a rate-limited request, retrying 429s, 5xx and connection errors with backoff"""
+    for attempt in range(MAX_RETRIES + 1):
+        rate_limiter.acquire(provider, tokens)
+        start = time.perf_counter()
+        try:
+            response = http_request(method, url, **kwargs)
+        except requests.RequestException:
+            metrics.request(provider, time.perf_counter() - start, 'connection')
+            if attempt == MAX_RETRIES:
+                raise
+            rate_limiter.record_retry(provider)
+            time.sleep(backoff_delay(attempt))
+            continue
+        
+        metrics.request(provider, time.perf_counter() - start, response.status_code)
+        if response.status_code == 200:
+            record_latency(provider, time.perf_counter() - start)
+        rate_limiter.observe(provider, response.headers)
+        if (response.status_code == 429 or response.status_code >= 500) and attempt < MAX_RETRIES:
+            delay = backoff_delay(attempt, _parse_reset(response.headers.get('retry-after')))
+            if response.status_code == 429:
+                rate_limiter.pause(provider, delay)
+            rate_limiter.record_retry(provider)
+            time.sleep(delay)
+            continue
+        return response
+
+
+def estimate_tokens(text: str, max_tokens: int = 0) -> int:
+    """Rough token count for TPM budgeting: ~4 characters per token plus the completion budget"""
+    return len(text) // 4 + max_tokens
+
+
+def is_error_response(text: str) -> bool:
+    return not text or text.startswith('Error:') or is_unavailable_response(text)
+
+
+def is_unavailable_response(text: str) -> bool:
+    """Placeholder for a platform skipped because its circuit breaker is open"""
+    return bool(text) and text.startswith(UNAVAILABLE_PREFIX)
+
+
+def empty_platform_score(notes: str = '') -> dict:
+    return {"mention": 0, "position": 0, "sentiment": 0, "recommendation": 0, "message_alignment": 0,
+            "overall": 0, "competitors_mentioned": "", "notes": notes}
+
+
+class BlobStore:
+    """Content-addressed store for raw LLM responses
+    
+    put() returns a ref ("sha256:<hex>") of the text; identical responses across runs and
+    customers are stored once. Blobs are compressed with zstd when `zstandard` is installed,
+    otherwise gzip, and can optionally be read through a memory map. A blob's mtime is its last
+    put(), which sweep() uses to expire and evict the least recently written blobs.
+    """
+    
+    def __init__(self, directory: str, use_mmap: bool = False):
+        self.directory = directory
+        self.use_mmap = use_mmap
+        try:
+            import zstandard
+            self._zstd = zstandard
+        except ImportError:
+            self._zstd = None
+    
+    def _path(self, digest: str, suffix: str) -> str:
+        return os.path.join(self.directory, digest[:2], digest[2:4], digest + suffix)
+    
+    def put(self, text: str) -> str:
+        data = text.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        ref = f"sha256:{digest}"
+        existing = self._find(digest)
+        if existing:
+            try:
+                os.utime(existing)
+                return ref
+            except FileNotFoundError:
+                pass  # swept meanwhile, write it again
+        
+        if self._zstd:
+            path, blob = self._path(digest, '.zst'), self._zstd.ZstdCompressor(level=10).compress(data)
+        else:
+            path, blob = self._path(digest, '.gz'), gzip.compress(data, mtime=0)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(blob)
+        os.replace(tmp, path)
+        return ref
+    
+    def _find(self, digest: str):
+        for suffix in ('.zst', '.gz'):
+            path = self._path(digest, suffix)
+            if os.path.exists(path):
+                return path
+        return None
+    
+    def get(self, ref: str) -> str:
+        digest = ref.split(':', 1)[-1]
+        path = self._find(digest)
+        if path is None:
+            raise KeyError(ref)
+        with open(path, 'rb') as f:
+            if self.use_mmap and os.path.getsize(path):
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as blob:
+                    return self._decompress(path, blob)
+            return self._decompress(path, f.read())
+    
+    def sweep(self, max_age: float = 0, max_bytes: int = 0, keep: set = frozenset()) -> dict:
+        """Delete blobs not written for `max_age` seconds, then the least recently written until the
+        store fits in `max_bytes` (0 disables either bound); digests in `keep` are never deleted"""
+        started = time.time()
+        blobs = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                blobs.append((stat.st_mtime, stat.st_size, path, name.split('.', 1)[0]))
+        blobs.sort()
+        
+        now = time.time()
+        total = sum(size for _, size, _, _ in blobs)
+        removed = freed = 0
+        for mtime, size, path, digest in blobs:
+            expired = max_age and now - mtime > max_age
+            over = max_bytes and total > max_bytes
+            if not (expired or over):
+                break  # oldest first, so nothing later qualifies either
+            if digest in keep:
+                continue
+            try:
+                if os.stat(path).st_mtime >= started:
+                    continue  # put() again since the sweep started: in use, not stale
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            removed += 1
+            freed += size
+        return {'removed': removed, 'freed_bytes': freed, 'remaining_bytes': total}
+    
+    def _decompress(self, path: str, blob) -> str:
+        if path.endswith('.zst'):
+            if not self._zstd:
+                raise RuntimeError(f"{path} is zstd-compressed but zstandard is not installed")
+            return self._zstd.ZstdDecompressor().decompressobj().decompress(blob).decode('utf-8')
+        return zlib.decompress(blob, wbits=31).decode('utf-8')
+
+
+blob_store = BlobStore(BLOB_STORE_DIR, BLOB_STORE_MMAP)
+
+
+class HistoryStore:
+    """Local time series of every run's aggregate scores, for dashboard history, trends and deltas
+    
+    One row per (run, platform) plus platform 'all' for the run's visibility score, indexed on
+    (brand, platform, recorded_at) so history and period lookups are index range scans.
+    """
+    
+    def __init__(self, path: str = HISTORY_PATH):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+    
+    def _connect(self):
+        """Open the database on first use, so importing the module does no file I/O"""
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS run_scores (run_id TEXT NOT NULL, brand TEXT NOT NULL, "
+                         "platform TEXT NOT NULL, recorded_at REAL NOT NULL, run_date TEXT NOT NULL, "
+                         "score REAL, mention REAL, sentiment REAL, recommendation REAL, "
+                         "PRIMARY KEY (run_id, platform))")
+            conn.execute("CREATE INDEX IF NOT EXISTS run_scores_series ON run_scores (brand, platform, recorded_at)")
+            self._conn = conn
+        return self._conn
+    
+    @staticmethod
+    def brand_key(brand_name: str) -> str:
+        return ' '.join((brand_name or '').lower().split())
+    
+    def record(self, analysis: dict, run_id: str, recorded_at: float = None) -> None:
+        """Store a run's analyze_run_data output (re-recording the same run replaces it)"""
+        recorded_at = recorded_at or time.time()
+        run_date = datetime.fromtimestamp(recorded_at).strftime('%Y-%m-%d')
+        brand = self.brand_key(analysis.get('brand_name'))
+        rows = [(run_id, brand, 'all', recorded_at, run_date, analysis.get('visibility_score', 0),
+                 analysis.get('brand_coverage', 0), None, None)]
+        for p, data in analysis.get('platforms_summary', {}).items():
+            if data.get('available', True):
+                rows.append((run_id, brand, p, recorded_at, run_date, data.get('score', 0), data.get('mention', 0),
+                             data.get('sentiment', 0), data.get('recommendation', 0)))
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN")
+            conn.execute("DELETE FROM run_scores WHERE run_id = ?", (run_id,))
+            conn.executemany("INSERT INTO run_scores VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            conn.execute("COMMIT")
+    
+    def history(self, brand_name: str, platform: str = 'all', limit: int = HISTORY_POINTS, until: float = None) -> list:
+        """The latest `limit` runs' scores for a brand and platform, oldest first"""
+        with self._lock:
+            rows = self._connect().execute("SELECT run_date, score, recorded_at, run_id FROM run_scores "
+                                     "WHERE brand = ? AND platform = ? AND recorded_at <= ? "
+                                     "ORDER BY recorded_at DESC LIMIT ?",
+                                     (self.brand_key(brand_name), platform, until or time.time(), limit)).fetchall()
+        return [{'date': d, 'score': s, 'recorded_at': t, 'run_id': r} for d, s, t, r in reversed(rows)]
+    
+    def score_before(self, brand_name: str, platform: str, before: float):
+        """Score of the latest run recorded strictly before `before`, or None"""
+        with self._lock:
+            row = self._connect().execute("SELECT score FROM run_scores WHERE brand = ? AND platform = ? AND recorded_at < ? "
+                                    "ORDER BY recorded_at DESC LIMIT 1",
+                                    (self.brand_key(brand_name), platform, before)).fetchone()
+        return row[0] if row else None
+    
+    def changes(self, brand_name: str, platform: str, run_id: str) -> dict:
+        """Trend and deltas for one run: against the previous run and against the run current
+        HISTORY_PERIOD_DAYS ago (None when there is no earlier run)"""
+        with self._lock:
+            row = self._connect().execute("SELECT score, recorded_at FROM run_scores WHERE run_id = ? AND platform = ?",
+                                    (run_id, platform)).fetchone()
+        if not row:
+            return {'trend': 'flat', 'delta': None, 'period_delta': None}
+        score, recorded_at = row
+        previous = self.score_before(brand_name, platform, recorded_at)
+        period_start = self.score_before(brand_name, platform, recorded_at - HISTORY_PERIOD_DAYS * 86400 + 1)
+        delta = round(score - previous, 1) if previous is not None else None
+        if delta is None or abs(delta) < TREND_THRESHOLD:
+            trend = 'flat'
+        else:
+            trend = 'up' if delta > 0 else 'down'
+        return {'trend': trend, 'delta': delta,
+                'period_delta': round(score - period_start, 1) if period_start is not None else None}
+
+
+history_store = HistoryStore(HISTORY_PATH) if HISTORY_ENABLED else None
+
+
+class RunJournal:
+    """Append-only JSON-lines journal of a run's completed work, keyed by run_id
+    
+    Every provider response, analysis, Airtable batch and pipeline step is appended (and fsynced)
+    as it completes. Opening with resume=True replays the file so only missing work is redone;
+    a torn final line from a crash is ignored.
+    """
+    
+    def __init__(self, run_id: str, resume: bool = False, directory: str = RUN_JOURNAL_DIR):
+        self.run_id = run_id
+        self.path = os.path.join(directory, f"{run_id}.jsonl")
+        self.run = None
+        self.steps = {}
+        self.responses = {}
+        self.analyses = {}
+        self.airtable_batches = {}
+        self._lock = threading.Lock()
+        
+        os.makedirs(directory, exist_ok=True)
+        if resume and os.path.exists(self.path):
+            self._replay()
+        self._file = open(self.path, 'a' if resume else 'w', encoding='utf-8')
+    
+    def _replay(self) -> None:
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                self._apply(entry)
+    
+    def _apply(self, entry: dict) -> None:
+        kind = entry.get('type')
+        if kind == 'run':
+            self.run = entry['run']
+        elif kind == 'step':
+            self.steps[entry['name']] = entry['value']
+        elif kind == 'response':
+            text = entry['text'] if 'text' in entry else blob_store.get(entry['ref'])
+            self.responses.setdefault(entry['question'], {})[entry['platform']] = text
+        elif kind == 'analysis':
+            self.analyses[entry['question']] = entry['analysis']
+        elif kind == 'airtable_batch':
+            self.airtable_batches[entry['first_question_number']] = entry['records']
+    
+    def _append(self, entry: dict, applied: dict = None) -> None:
+        line = json.dumps(entry) + '\n'
+        with self._lock:
+            self._apply(applied or entry)
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+    
+    def record_run(self, run: dict) -> None:
+        self._append({'type': 'run', 'run': run})
+    
+    def record_step(self, name: str, value) -> None:
+        self._append({'type': 'step', 'name': name, 'value': value})
+    
+    def record_response(self, question: int, platform: str, text: str) -> None:
+        entry = {'type': 'response', 'question': question, 'platform': platform}
+        if BLOB_STORE_ENABLED:
+            self._append({**entry, 'ref': blob_store.put(text)}, applied={**entry, 'text': text})
+        else:
+            self._append({**entry, 'text': text})
+    
+    def record_analysis(self, question: int, analysis: dict) -> None:
+        self._append({'type': 'analysis', 'question': question, 'analysis': analysis})
+    
+    def record_airtable_batch(self, first_question_number: int, records: list) -> None:
+        self._append({'type': 'airtable_batch', 'first_question_number': first_question_number, 'records': records})
+    
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+    
+    def discard(self) -> None:
+        """Close and delete the journal once its run has finished (nothing is left to resume)"""
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def prune_journals(max_age: float, directory: str = RUN_JOURNAL_DIR) -> int:
+    """Delete journals not written for `max_age` seconds (runs abandoned mid-way); returns how many"""
+    if not max_age or not os.path.isdir(directory):
+        return 0
+    cutoff = time.time() - max_age
+    removed = 0
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            if name.endswith('.jsonl') and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            continue
+    return removed
+
+
+def live_blob_digests(directory: str = RUN_JOURNAL_DIR) -> set:
+    """Blob digests referenced by journals of runs not yet finished (they may still be resumed)"""
+    live = set()
+    if not os.path.isdir(directory):
+        return live
+    for name in os.listdir(directory):
+        if not name.endswith('.jsonl'):
+            continue
+        refs = set()
+        finished = False
+        try:
+            with open(os.path.join(directory, name), encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if entry.get('type') == 'response' and 'ref' in entry:
+                        refs.add(entry['ref'].split(':', 1)[-1])
+                    elif entry.get('type') == 'step' and entry.get('name') == 'finished':
+                        finished = True
+        except OSError:
+            continue
+        if not finished:
+            live |= refs
+    return live
+
+
+_last_blob_sweep = None
+_blob_sweep_lock = threading.Lock()
+
+
+def sweep_blob_store(force: bool = False):
+    """Apply blob retention (BLOB_STORE_TTL, BLOB_STORE_MAX_MB), at most every BLOB_STORE_SWEEP_INTERVAL
+    seconds unless forced; returns the sweep report, or None when skipped"""
+    global _last_blob_sweep
+    if not (BLOB_STORE_ENABLED and (BLOB_STORE_TTL or BLOB_STORE_MAX_MB)):
+        return None
+    with _blob_sweep_lock:
+        now = time.monotonic()
+        if not force and _last_blob_sweep is not None and now - _last_blob_sweep < BLOB_STORE_SWEEP_INTERVAL:
+            return None
+        _last_blob_sweep = now
+    # A journal older than the blob TTL can no longer be resumed: its responses are about to expire
+    prune_journals(BLOB_STORE_TTL)
+    report = blob_store.sweep(BLOB_STORE_TTL, int(BLOB_STORE_MAX_MB * 1024 * 1024), live_blob_digests())
+    metrics.inc('tracker_blobs_swept_total', report['removed'])
+    return report
+
+
+def clamp_score(value) -> float:
+    """Coerce a model-reported score to a number in 0-100 (non-numeric -> 0)"""
+    if isinstance(value, bool):
+        value = int(value)
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return 0
+    if value != value:
+        return 0
+    value = min(100.0, max(0.0, value))
+    return int(value) if value.is_integer() else value
+
+
+def sample_count(value) -> int:
+    """Coerce a stored sample count to a non-negative int (anything else -> 0)"""
+    try:
+        return max(0, int(value or 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+@dataclass(slots=True)
+class PlatformScore:
+    """One platform's scores for one question, validated and clamped to 0-100 at ingestion
+    
+    `available` is False when the platform was not asked (circuit open); such scores are
+    excluded from run averages rather than counted as zeros. With multi-sample querying,
+    `samples` answers were drawn and `sample_mentions` of them named the brand (0 and 0 otherwise).
+    """
+    mention: float = 0
+    position: float = 0
+    sentiment: float = 0
+    recommendation: float = 0
+    message_alignment: float = 0
+    overall: float = 0
+    competitors_mentioned: str = ''
+    notes: str = ''
+    available: bool = True
+    samples: int = 0
+    sample_mentions: int = 0
+    
+    @classmethod
+    def from_dict(cls, data) -> 'PlatformScore':
+        data = data if isinstance(data, dict) else {}
+        samples = sample_count(data.get('samples'))
+        return cls(*(clamp_score(data.get(m, 0)) for m in SCORE_FIELDS),
+                   competitors_mentioned=str(data.get('competitors_mentioned') or ''),
+                   notes=str(data.get('notes') or ''),
+                   available=data.get('available', True) is not False,
+                   samples=samples,
+                   sample_mentions=min(samples, sample_count(data.get('sample_mentions'))))
+    
+    def as_dict(self) -> dict:
+        return {**{m: getattr(self, m) for m in SCORE_FIELDS},
+                'competitors_mentioned': self.competitors_mentioned, 'notes': self.notes,
+                'available': self.available, 'samples': self.samples, 'sample_mentions': self.sample_mentions}
+
+
+@dataclass(slots=True)
+class QuestionResult:
+    """One question's result: small numeric payload in `scores`, raw response text kept apart
+    
+    `responses` maps platform -> raw text and is dropped by slim() once the record is persisted.
+    `response_refs` maps platform -> blob store ref, used instead of holding the text in memory.
+    """
+    run_id: str
+    customer_id: str
+    run_date: str
+    brand_name: str
+    question_text: str
+    question_category: str
+    scores: dict = field(default_factory=dict)
+    responses: dict = None
+    response_refs: dict = None
+    
+    @classmethod
+    def from_dict(cls, r: dict) -> 'QuestionResult':
+        """Build from the legacy result dict shape (`analysis` plus `<platform>_response` keys)"""
+        analysis = r.get('analysis', {})
+        responses = {p: r[f"{p}_response"] for p in PLATFORMS if f"{p}_response" in r}
+        return cls(
+            run_id=r.get('run_id', ''),
+            customer_id=r.get('customer_id', ''),
+            run_date=r.get('run_date', ''),
+            brand_name=r.get('brand_name', ''),
+            question_text=r.get('question_text', ''),
+            question_category=r.get('question_category', ''),
+            scores={p: PlatformScore.from_dict(analysis.get(p)) for p in PLATFORMS},
+            responses=responses or None
+        )
+    
+    def score(self, platform: str) -> PlatformScore:
+        return self.scores.get(platform) or PlatformScore()
+    
+    def response_text(self, platform: str) -> str:
+        if self.responses and platform in self.responses:
+            return self.responses[platform]
+        if self.response_refs and platform in self.response_refs:
+            try:
+                return blob_store.get(self.response_refs[platform])
+            except (KeyError, FileNotFoundError):
+                return ''  # blob swept before this result was written out
+        return ''
+    
+    def slim(self) -> 'QuestionResult':
+        """Copy without the raw responses, for aggregation"""
+        return QuestionResult(self.run_id, self.customer_id, self.run_date, self.brand_name,
+                              self.question_text, self.question_category, self.scores)
+    
+    def as_dict(self) -> dict:
+        """Legacy result dict shape"""
+        result = {
+            'run_id': self.run_id,
+            'customer_id': self.customer_id,
+            'run_date': self.run_date,
+            'brand_name': self.brand_name,
+            'question_text': self.question_text,
+            'question_category': self.question_category,
+        }
+        for p in PLATFORMS:
+            result[f"{p}_response"] = self.response_text(p)
+        result['analysis'] = {p: self.score(p).as_dict() for p in PLATFORMS}
+        return result
+    
+    def to_airtable_fields(self, session_id: str, question_number: int) -> dict:
+        """Raw Question Data record fields"""
+        fields = {
+            "session_id": session_id,
+            "run_id": self.run_id,
+            "customer_id": self.customer_id,
+            "question_number": question_number,
+            "question_text": self.question_text,
+            "question_category": self.question_category,
+            "analyzed_at": self.run_date,
+        }
+        
+        # Raw responses (or their blob refs when AIRTABLE_RESPONSE_REFS is set)
+        for p in PLATFORMS:
+            if AIRTABLE_RESPONSE_REFS and self.response_refs and p in self.response_refs:
+                fields[f"{p}_response"] = self.response_refs[p]
+            else:
+                fields[f"{p}_response"] = self.response_text(p)
+        
+        # Per-platform scores
+        for p in PLATFORMS:
+            score = self.score(p)
+            for metric in SCORE_FIELDS:
+                fields[f"{p}_{metric}"] = getattr(score, metric)
+            fields[f"{p}_competitors_mentioned"] = [score.competitors_mentioned] if score.competitors_mentioned else []
+            fields[f"{p}_notes"] = score.notes
+        return fields
+
+
+def as_question_result(r) -> QuestionResult:
+    return r if isinstance(r, QuestionResult) else QuestionResult.from_dict(r)
+
+
+AIRTABLE_BATCH_SIZE = 10  # Airtable accepts max 10 records per request
+AIRTABLE_WRITE_CONCURRENCY = int(os.environ.get("AIRTABLE_WRITE_CONCURRENCY", "5"))
+
+
+def write_airtable_records(table: str, records_fields: list, merge_on: list = None, labels: list = None) -> dict:
+    """Write records to an Airtable table in concurrent batches of 10 (Steps 22-24)
+    
+    With `merge_on`, batches are upserts (PATCH with performUpsert) so re-sending a record updates
+    it instead of duplicating it. Batches go out AIRTABLE_WRITE_CONCURRENCY at a time under the
+    Airtable rate limit; 429s and 5xx are retried by send_with_retry. Returns a report with
+    one entry per batch plus the combined list of written records.
+    """
     
     from urllib.parse import quote
-    url = f"https://api.airtable.com/v0/{AIRTABLE_BASE_ID}/{quote(table_name)}"
+    url = f"{AIRTABLE_API_BASE}/{AIRTABLE_BASE_ID}/{quote(table)}"
     headers = {
         "Authorization": f"Bearer {AIRTABLE_API_KEY}",
         "Content-Type": "application/json"
     }
     
-    created_records = []
+    def send_batch(n, start):
+        batch = records_fields[start:start + AIRTABLE_BATCH_SIZE]
+        payload = {"records": [{"fields": fields} for fields in batch]}
+        if merge_on:
+            payload["performUpsert"] = {"fieldsToMergeOn": merge_on}
+        entry = {'batch': n, 'label': labels[n] if labels else n, 'size': len(batch), 'ok': False,
+                 'status': None, 'records': [], 'error': ''}
+        try:
+            response = send_with_retry('airtable', 'PATCH' if merge_on else 'POST', url, headers=headers, json=payload)
+        except requests.RequestException as e:
+            entry['error'] = str(e)
+            return entry
+        entry['status'] = response.status_code
+        if response.status_code == 200:
+            entry['ok'] = True
+            entry['records'] = response.json().get('records', [])
+        else:
+            entry['error'] = response.text
+        return entry
+    
+    starts = list(range(0, len(records_fields), AIRTABLE_BATCH_SIZE))
+    workers = max(1, min(AIRTABLE_WRITE_CONCURRENCY, len(starts)))
+    with ContextThreadPool(max_workers=workers) as pool:
+        batches = list(pool.map(send_batch, range(len(starts)), starts))
+    
+    return {
+        'batches': batches,
+        'succeeded': sum(1 for b in batches if b['ok']),
+        'failed': sum(1 for b in batches if not b['ok']),
+        'records': [record for b in batches for record in b['records']]
+    }
+
+
+def save_to_airtable_report(results: list, session_id: str, table_name: str = "Raw Question Data",
+                            first_question_number: int = 1) -> dict:
+    """Save tracker results to Airtable (Steps 22-24), returning the write_airtable_records report
+    
+    Records are upserted on (run_id, question_number), so saving the same results again never
+    creates duplicate rows. Batches still failing after retries are printed and marked in the report.
+    """
     
-    # Airtable accepts max 10 records per request
-    for i in range(0, len(results), 10):
-        batch = results[i:i+10]
+    records_fields = [as_question_result(r).to_airtable_fields(session_id, first_question_number + i)
+                      for i, r in enumerate(results)]
+    labels = [first_question_number + start for start in range(0, len(records_fields), AIRTABLE_BATCH_SIZE)]
+    report = write_airtable_records(table_name, records_fields, merge_on=["run_id", "question_number"], labels=labels)
+    for b in report['batches']:
+        if not b['ok']:
+            print(f"Airtable error (questions from {b['label']}): {b['status']} - {b['error']}")
+    return report
+
+
+def save_to_airtable(results: list, session_id: str, table_name: str = "Raw Question Data",
+                     first_question_number: int = 1) -> list:
+    """Save tracker results to Airtable (Steps 22-24), returning the written records"""
+    return save_to_airtable_report(results, session_id, table_name, first_question_number)['records']
+
+
+class AhoCorasick:
+    """Multi-pattern substring matcher: finds every pattern occurring in a text in one pass"""
+    
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [set()]
+        for pattern in patterns:
+            if not pattern:
+                continue
+            node = 0
+            for ch in pattern:
+                nxt = self.goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[node][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append(set())
+                node = nxt
+            self.out[node].add(pattern)
         
-        records = []
-        for idx, r in enumerate(batch):
-            analysis = r.get('analysis', {})
-            
-            record = {
-                "fields": {
-                    "session_id": session_id,
-                    "run_id": r.get('run_id', ''),
-                    "customer_id": r.get('customer_id', ''),
-                    "question_number": i + idx + 1,
-                    "question_text": r.get('question_text', ''),
-                    "question_category": r.get('question_category', ''),
-                    "analyzed_at": r.get('run_date', ''),
-                    
-                    # Raw responses
-                    "chatgpt_response": r.get('chatgpt_response', ''),
-                    "claude_response": r.get('claude_response', ''),
-                    "gemini_response": r.get('gemini_response', ''),
-                    "perplexity_response": r.get('perplexity_response', ''),
-                    
-                    # ChatGPT scores
-                    "chatgpt_mention": analysis.get('chatgpt', {}).get('mention', 0),
-                    "chatgpt_position": analysis.get('chatgpt', {}).get('position', 0),
-                    "chatgpt_sentiment": analysis.get('chatgpt', {}).get('sentiment', 0),
-                    "chatgpt_recommendation": analysis.get('chatgpt', {}).get('recommendation', 0),
-                    "chatgpt_message_alignment": analysis.get('chatgpt', {}).get('message_alignment', 0),
-                    "chatgpt_overall": analysis.get('chatgpt', {}).get('overall', 0),
-                    "chatgpt_competitors_mentioned": [analysis.get('chatgpt', {}).get('competitors_mentioned', '')] if analysis.get('chatgpt', {}).get('competitors_mentioned') else [],
-                    "chatgpt_notes": analysis.get('chatgpt', {}).get('notes', ''),
-                    
-                    # Claude scores
-                    "claude_mention": analysis.get('claude', {}).get('mention', 0),
-                    "claude_position": analysis.get('claude', {}).get('position', 0),
-                    "claude_sentiment": analysis.get('claude', {}).get('sentiment', 0),
-                    "claude_recommendation": analysis.get('claude', {}).get('recommendation', 0),
-                    "claude_message_alignment": analysis.get('claude', {}).get('message_alignment', 0),
-                    "claude_overall": analysis.get('claude', {}).get('overall', 0),
-                    "claude_competitors_mentioned": [analysis.get('claude', {}).get('competitors_mentioned', '')] if analysis.get('claude', {}).get('competitors_mentioned') else [],
-                    "claude_notes": analysis.get('claude', {}).get('notes', ''),
-                    
-                    # Gemini scores
-                    "gemini_mention": analysis.get('gemini', {}).get('mention', 0),
-                    "gemini_position": analysis.get('gemini', {}).get('position', 0),
-                    "gemini_sentiment": analysis.get('gemini', {}).get('sentiment', 0),
-                    "gemini_recommendation": analysis.get('gemini', {}).get('recommendation', 0),
-                    "gemini_message_alignment": analysis.get('gemini', {}).get('message_alignment', 0),
-                    "gemini_overall": analysis.get('gemini', {}).get('overall', 0),
-                    "gemini_competitors_mentioned": [analysis.get('gemini', {}).get('competitors_mentioned', '')] if analysis.get('gemini', {}).get('competitors_mentioned') else [],
-                    "gemini_notes": analysis.get('gemini', {}).get('notes', ''),
-                    
-                    # Perplexity scores
-                    "perplexity_mention": analysis.get('perplexity', {}).get('mention', 0),
-                    "perplexity_position": analysis.get('perplexity', {}).get('position', 0),
-                    "perplexity_sentiment": analysis.get('perplexity', {}).get('sentiment', 0),
-                    "perplexity_recommendation": analysis.get('perplexity', {}).get('recommendation', 0),
-                    "perplexity_message_alignment": analysis.get('perplexity', {}).get('message_alignment', 0),
-                    "perplexity_overall": analysis.get('perplexity', {}).get('overall', 0),
-                    "perplexity_competitors_mentioned": [analysis.get('perplexity', {}).get('competitors_mentioned', '')] if analysis.get('perplexity', {}).get('competitors_mentioned') else [],
-                    "perplexity_notes": analysis.get('perplexity', {}).get('notes', '')
-                }
-            }
-            records.append(record)
+        # Breadth-first failure links
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self.goto[node].items():
+                queue.append(nxt)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.out[nxt] |= self.out[self.fail[nxt]]
+    
+    def find(self, text: str) -> set:
+        found = set()
+        node = 0
+        for ch in text:
+            while node and ch not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(ch, 0)
+            if self.out[node]:
+                found |= self.out[node]
+        return found
+
+
+class CompetitorIndex:
+    """Case-folded alias map over valid competitors and brand variations, built once per run
+    
+    Maps raw `competitors_mentioned` strings to clean brand names, and counts in how many
+    platform answers each brand appears with a single Aho-Corasick pass per distinct string.
+    """
+    
+    INVALID_NAMES = {'none', 'n/a', 'na', 'null', 'undefined', 'other', 'none explicitly', 'none mentioned'}
+    
+    def __init__(self, valid_competitors: list, brand_name: str = '', brand_variations: list = None):
+        self.aliases = {}
+        for vc in valid_competitors or []:
+            self.aliases.setdefault(vc.lower().strip(), vc)
+        for variation in brand_variations or []:
+            if variation and variation.strip():
+                self.aliases[variation.lower().strip()] = brand_name
+        self._extracted = {}
+    
+    @classmethod
+    def is_invalid_brand(cls, name) -> bool:
+        if not name:
+            return True
+        return name.lower().strip() in cls.INVALID_NAMES or len(name) > 40
+    
+    def extract(self, comp_str) -> list:
+        """Clean brand names in a competitors_mentioned string (memoized per distinct string)"""
+        if not comp_str:
+            return []
+        comp_str = str(comp_str)
+        cached = self._extracted.get(comp_str)
+        if cached is not None:
+            return cached
+        brands = set()
+        for part in re.split(r'[;,]', comp_str):
+            part = re.sub(r'\s*\([^)]*\)\s*$', '', part.strip()).strip()
+            if self.is_invalid_brand(part):
+                continue
+            canonical = self.aliases.get(part.lower())
+            if canonical:
+                brands.add(canonical)
+            elif 1 < len(part) < 35:
+                brands.add(part.title())
+        self._extracted[comp_str] = list(brands)
+        return self._extracted[comp_str]
+    
+    @staticmethod
+    def count_mentions(brands, comp_strings) -> dict:
+        """Number of strings containing each brand name (case-insensitive substring match)"""
+        by_pattern = {}
+        for brand in brands:
+            by_pattern.setdefault(brand.lower(), []).append(brand)
+        matcher = AhoCorasick(by_pattern)
         
-        payload = {"records": records}
-        response = requests.post(url, headers=headers, json=payload)
+        counts = {brand: 0 for brand in brands}
+        for text, n in Counter(str(c).lower() for c in comp_strings).items():
+            for pattern in matcher.find(text):
+                for brand in by_pattern[pattern]:
+                    counts[brand] += n
+        return counts
+
+
+@functools.lru_cache(maxsize=None)
+def z_value(confidence: float) -> float:
+    """Two-sided standard normal quantile for a confidence level (0.95 -> 1.96)"""
+    from statistics import NormalDist
+    return NormalDist().inv_cdf(0.5 + confidence / 2)
+
+
+def wilson_interval(successes: int, trials: int, confidence: float = SAMPLE_CONFIDENCE) -> tuple:
+    """Wilson score interval (low, high) of a proportion, in 0-1; (0, 1) without trials"""
+    if trials <= 0:
+        return 0.0, 1.0
+    z = z_value(confidence)
+    rate = successes / trials
+    denominator = 1 + z * z / trials
+    centre = (rate + z * z / (2 * trials)) / denominator
+    half = z * math.sqrt(rate * (1 - rate) / trials + z * z / (4 * trials * trials)) / denominator
+    return max(0.0, centre - half), min(1.0, centre + half)
+
+
+def _numpy():
+    """NumPy when installed (optional, used for vectorized aggregation), else None"""
+    try:
+        import numpy
+        return numpy
+    except ImportError:
+        return None
+
+
+class ScoreTable:
+    """Columnar questions x platforms x metrics score matrix for run aggregation
+    
+    Scores come from QuestionResult records (already clamped to 0-100). Averages and mention
+    flags are computed with vectorized NumPy operations, or with plain lists giving the same
+    results when NumPy is not installed. Cells of unavailable platforms are left out of averages.
+    """
+    
+    def __init__(self, results: list, platforms: list = PLATFORMS, metrics: list = SCORE_FIELDS):
+        self.platforms = list(platforms)
+        self.metrics = list(metrics)
+        rows = []
+        available = []
+        for r in results:
+            r = as_question_result(r)
+            rows.append([[float(getattr(r.score(p), m)) for m in self.metrics] for p in self.platforms])
+            available.append([r.score(p).available for p in self.platforms])
         
-        if response.status_code == 200:
-            created_records.extend(response.json().get('records', []))
+        self.num_questions = len(rows)
+        self._np = _numpy()
+        if self._np:
+            self.values = self._np.array(rows, dtype=float).reshape(len(rows), len(self.platforms), len(self.metrics))
+            self.available = self._np.array(available, dtype=bool).reshape(len(rows), len(self.platforms))
         else:
-            print(f"Airtable error: {response.status_code} - {response.text}")
+            self.values = rows
+            self.available = available
+    
+    def avg(self, platform: str, metric: str, nonzero: bool = False) -> float:
+        """Mean of scores <= 100 (and > 0 if nonzero), rounded to 1 place; 0 if none"""
+        pi = self.platforms.index(platform)
+        mi = self.metrics.index(metric)
+        if self._np:
+            column = self.values[:, pi, mi]
+            mask = (column <= 100) & self.available[:, pi]
+            if nonzero:
+                mask &= column > 0
+            count = int(mask.sum())
+            return round(float(column[mask].sum()) / count, 1) if count else 0
+        valid = [row[pi][mi] for row, ok in zip(self.values, self.available)
+                 if ok[pi] and row[pi][mi] <= 100 and (not nonzero or row[pi][mi] > 0)]
+        return round(sum(valid) / len(valid), 1) if valid else 0
     
-    return created_records
+    def interval(self, platform: str, metric: str, nonzero: bool = False,
+                 confidence: float = SAMPLE_CONFIDENCE) -> list:
+        """Normal-approximation confidence interval [low, high] of avg() across questions, within 0-100
+        
+        Fewer than two scores say nothing about the spread, so the interval is then [0, 100].
+        """
+        pi = self.platforms.index(platform)
+        mi = self.metrics.index(metric)
+        if self._np:
+            column = self.values[:, pi, mi]
+            mask = (column <= 100) & self.available[:, pi]
+            if nonzero:
+                mask &= column > 0
+            valid = column[mask].tolist()
+        else:
+            valid = [row[pi][mi] for row, ok in zip(self.values, self.available)
+                     if ok[pi] and row[pi][mi] <= 100 and (not nonzero or row[pi][mi] > 0)]
+        if len(valid) < 2:
+            return [0, 100]
+        mean = sum(valid) / len(valid)
+        variance = sum((v - mean) ** 2 for v in valid) / (len(valid) - 1)
+        half = z_value(confidence) * math.sqrt(variance / len(valid))
+        return [round(max(0.0, mean - half), 1), round(min(100.0, mean + half), 1)]
+    
+    def mention_counts(self, platform: str) -> tuple:
+        """(questions naming the brand, questions answered) for the platform, unavailable cells left out"""
+        pi = self.platforms.index(platform)
+        mi = self.metrics.index('mention')
+        if self._np:
+            mask = self.available[:, pi]
+            return int(((self.values[:, pi, mi] > 0) & mask).sum()), int(mask.sum())
+        hits = sum(1 for row, ok in zip(self.values, self.available) if ok[pi] and row[pi][mi] > 0)
+        return hits, self.available_count(platform)
+    
+    def available_count(self, platform: str) -> int:
+        """Questions the platform actually answered or was asked (circuit not open)"""
+        pi = self.platforms.index(platform)
+        if self._np:
+            return int(self.available[:, pi].sum())
+        return sum(1 for ok in self.available if ok[pi])
+    
+    def mentioned(self) -> list:
+        """Per question, per platform: was the brand mentioned (mention > 0)"""
+        mi = self.metrics.index('mention')
+        if self._np:
+            return (self.values[:, :, mi] > 0).tolist()
+        return [[cells[mi] > 0 for cells in row] for row in self.values]
 
 
-def analyze_run_data(results: list, brand_name: str, valid_competitors: list, industry: str) -> dict:
+def analyze_run_data(results: list, brand_name: str, valid_competitors: list, industry: str,
+                     brand_variations: list = None) -> dict:
     """Aggregate all question results into dashboard metrics (Step 27)"""
-    import re
     
     def avg(nums):
         valid = [n for n in nums if isinstance(n, (int, float)) and n <= 100]
@@ -119,86 +1825,36 @@ def analyze_run_data(results: list, brand_name: str, valid_competitors: list, in
         valid = [n for n in nums if isinstance(n, (int, float)) and n > 0 and n <= 100]
         return round(sum(valid) / len(valid), 1) if valid else 0
     
-    def is_invalid_brand(name):
-        if not name:
-            return True
-        lower = name.lower().strip()
-        invalid_exact = ['none', 'n/a', 'na', 'null', 'undefined', 'other', 'none explicitly', 'none mentioned']
-        return lower in invalid_exact or len(name) > 40
-    
-    def extract_clean_brands(comp_str):
-        if not comp_str:
-            return []
-        brands = []
-        parts = re.split(r'[;,]', str(comp_str))
-        for part in parts:
-            part = part.strip()
-            part = re.sub(r'\s*\([^)]*\)\s*$', '', part).strip()
-            if is_invalid_brand(part):
-                continue
-            for vc in valid_competitors:
-                if vc.lower().strip() == part.lower().strip():
-                    brands.append(vc)
-                    break
-            else:
-                if len(part) > 1 and len(part) < 35:
-                    brands.append(part.title())
-        return list(set(brands))
+    is_invalid_brand = CompetitorIndex.is_invalid_brand
     
     # Capitalize brand name
     brand_name = brand_name[0].upper() + brand_name[1:] if len(brand_name) > 1 else brand_name.upper()
+    competitor_index = CompetitorIndex(valid_competitors, brand_name, brand_variations)
     
+    results = [as_question_result(r) for r in results]
     num_questions = len(results)
-    platforms = ['chatgpt', 'claude', 'gemini', 'perplexity']
-    platform_names = {'chatgpt': 'ChatGPT', 'claude': 'Claude', 'gemini': 'Gemini', 'perplexity': 'Perplexity'}
-    
-    # Build platform data from results
-    platform_data = {p: {'mention': [], 'position': [], 'sentiment': [], 'recommendation': [], 
-                         'message_alignment': [], 'overall': [], 'competitors_mentioned': []} for p in platforms}
     
-    for r in results:
-        analysis = r.get('analysis', {})
-        for p in platforms:
-            p_analysis = analysis.get(p, {})
-            platform_data[p]['mention'].append(p_analysis.get('mention', 0))
-            platform_data[p]['position'].append(p_analysis.get('position', 0))
-            platform_data[p]['sentiment'].append(p_analysis.get('sentiment', 0))
-            platform_data[p]['recommendation'].append(min(p_analysis.get('recommendation', 0), 100))
-            platform_data[p]['message_alignment'].append(p_analysis.get('message_alignment', 0))
-            platform_data[p]['overall'].append(p_analysis.get('overall', 0))
-            platform_data[p]['competitors_mentioned'].append(p_analysis.get('competitors_mentioned', ''))
+    # Load scores into a columnar table; competitor strings stay as a flat list
+    scores = ScoreTable(results)
+    mentioned = scores.mentioned()
+    all_comp_strings = [r.score(p).competitors_mentioned for p in PLATFORMS for r in results]
     
     # Count brand mentions
     brand_mention_counts = {}
-    brand_sentiment_scores = {}
-    brand_mentioned_per_question = []
-    
-    for i in range(num_questions):
-        question_brand_mentioned = False
-        for p in platforms:
-            mention_val = platform_data[p]['mention'][i]
-            sentiment_val = platform_data[p]['sentiment'][i]
-            if mention_val > 0:
-                question_brand_mentioned = True
-                brand_mention_counts[brand_name] = brand_mention_counts.get(brand_name, 0) + 1
-                if brand_name not in brand_sentiment_scores:
-                    brand_sentiment_scores[brand_name] = []
-                if 0 < sentiment_val <= 100:
-                    brand_sentiment_scores[brand_name].append(sentiment_val)
-        brand_mentioned_per_question.append(question_brand_mentioned)
+    brand_mentioned_per_question = [any(row) for row in mentioned]
+    brand_mentions = sum(sum(row) for row in mentioned)
+    if brand_mentions:
+        brand_mention_counts[brand_name] = brand_mentions
     
     # Extract competitor mentions
     all_competitors = set()
-    for p in platforms:
-        for comp_str in platform_data[p]['competitors_mentioned']:
-            all_competitors.update(extract_clean_brands(comp_str))
+    for comp_str in all_comp_strings:
+        all_competitors.update(competitor_index.extract(comp_str))
+    all_competitors = [c for c in all_competitors if c and c.lower() != brand_name.lower()]
     
-    for comp in all_competitors:
-        if comp and comp.lower() != brand_name.lower():
-            count = sum(1 for p in platforms for c in platform_data[p]['competitors_mentioned'] if comp.lower() in str(c).lower())
-            if count > 0:
-                brand_mention_counts[comp] = count
-                brand_sentiment_scores[comp] = [50]
+    for comp, count in CompetitorIndex.count_mentions(all_competitors, all_comp_strings).items():
+        if count > 0:
+            brand_mention_counts[comp] = count
     
     brand_appeared_count = sum(1 for m in brand_mentioned_per_question if m)
     brand_coverage = round((brand_appeared_count / num_questions) * 100, 1) if num_questions > 0 else 0
@@ -224,25 +1880,42 @@ def analyze_run_data(results: list, brand_name: str, valid_competitors: list, in
             brand_sov = b['share_of_voice']
             break
     
-    # Platform metrics
+    # Platform metrics, each average with its confidence interval across questions. The mention rate
+    # is pooled over every sample drawn (multi-sample querying), else over the questions answered.
     platforms_summary = {}
-    for p in platforms:
+    for p in PLATFORMS:
+        sampled = [r.score(p) for r in results if r.score(p).available and r.score(p).samples]
+        if sampled:
+            hits, trials = sum(s.sample_mentions for s in sampled), sum(s.samples for s in sampled)
+        else:
+            hits, trials = scores.mention_counts(p)
+        low, high = wilson_interval(hits, trials)
         platforms_summary[p] = {
-            'score': avg(platform_data[p]['overall']),
-            'mention': avg(platform_data[p]['mention']),
-            'sentiment': avg_nonzero(platform_data[p]['sentiment']),
-            'recommendation': avg(platform_data[p]['recommendation'])
+            'score': scores.avg(p, 'overall'),
+            'mention': scores.avg(p, 'mention'),
+            'sentiment': scores.avg(p, 'sentiment', nonzero=True),
+            'recommendation': scores.avg(p, 'recommendation'),
+            'score_ci': scores.interval(p, 'overall'),
+            'mention_ci': scores.interval(p, 'mention'),
+            'sentiment_ci': scores.interval(p, 'sentiment', nonzero=True),
+            'recommendation_ci': scores.interval(p, 'recommendation'),
+            'mention_rate': round(hits / trials * 100, 1) if trials else 0,
+            'mention_rate_ci': [round(low * 100, 1), round(high * 100, 1)],
+            'samples': trials,
+            'available': scores.available_count(p) > 0 or num_questions == 0
         }
     
-    all_scores = [platforms_summary[p]['score'] for p in platforms]
+    # Platforms that were unavailable for the whole run do not count towards run-level figures
+    live_platforms = [p for p in PLATFORMS if platforms_summary[p]['available']] or PLATFORMS
+    all_scores = [platforms_summary[p]['score'] for p in live_platforms]
     overall_score = round(sum(all_scores) / len(all_scores), 1) if all_scores else 0
     
-    sorted_platforms = sorted(platforms_summary.items(), key=lambda x: x[1]['score'], reverse=True)
-    best_model = platform_names[sorted_platforms[0][0]] if sorted_platforms else ''
-    worst_model = platform_names[sorted_platforms[-1][0]] if sorted_platforms else ''
+    sorted_platforms = sorted(((p, platforms_summary[p]) for p in live_platforms), key=lambda x: x[1]['score'], reverse=True)
+    best_model = PLATFORM_NAMES[sorted_platforms[0][0]] if sorted_platforms else ''
+    worst_model = PLATFORM_NAMES[sorted_platforms[-1][0]] if sorted_platforms else ''
     
     # Platform consistency
-    platform_mention_rates = {p: avg(platform_data[p]['mention']) for p in platforms}
+    platform_mention_rates = {p: platforms_summary[p]['mention'] for p in live_platforms}
     consistency_values = list(platform_mention_rates.values())
     platform_consistency = {
         'rates': platform_mention_rates,
@@ -255,22 +1928,19 @@ def analyze_run_data(results: list, brand_name: str, valid_competitors: list, in
     # Question breakdown
     question_breakdown = []
     for i, r in enumerate(results):
-        mentioned_on = []
-        for p in platforms:
-            if platform_data[p]['mention'][i] > 0:
-                mentioned_on.append(p[0].upper())
+        mentioned_on = [p[0].upper() for p, hit in zip(PLATFORMS, mentioned[i]) if hit]
         question_breakdown.append({
             'q': i + 1,
-            'text': r.get('question_text', '')[:50],
-            'category': r.get('question_category', ''),
+            'text': r.question_text[:50],
+            'category': r.question_category,
             'm': 1 if mentioned_on else 0,
             'p': ''.join(mentioned_on)
         })
     
     # Recommendations
     recommendations = []
-    avg_rec = avg([platforms_summary[p]['recommendation'] for p in platforms])
-    avg_sent = avg_nonzero([platforms_summary[p]['sentiment'] for p in platforms])
+    avg_rec = avg([platforms_summary[p]['recommendation'] for p in live_platforms])
+    avg_sent = avg_nonzero([platforms_summary[p]['sentiment'] for p in live_platforms])
     
     if brand_coverage < 50:
         recommendations.append({'priority': 'high', 'action': 'Increase visibility', 'detail': f'{brand_coverage}% coverage'})
@@ -318,33 +1988,54 @@ def analyze_run_data(results: list, brand_name: str, valid_competitors: list, in
         'question_breakdown': question_breakdown,
         'brand_coverage': brand_coverage,
         'recommendations': recommendations,
+        'confidence_level': SAMPLE_CONFIDENCE,
         'num_questions_processed': num_questions
     }
 
 
 def save_dashboard_output(analysis: dict, run_id: str, session_id: str, brand_logo: str, 
                           table_name: str = "tblheMjYJzu1f88Ft") -> dict:
-    """Save aggregated analysis to Dashboard Output table (Step 30)"""
+    """Save aggregated analysis to Dashboard Output table (Step 30)
     
-    from urllib.parse import quote
-    url = f"https://api.airtable.com/v0/{AIRTABLE_BASE_ID}/{table_name}"
+    The run is first recorded in the local score history, which supplies history_json and each
+    platform's trend and deltas.
+    """
+    
+    url = f"{AIRTABLE_API_BASE}/{AIRTABLE_BASE_ID}/{table_name}"
     headers = {
         "Authorization": f"Bearer {AIRTABLE_API_KEY}",
         "Content-Type": "application/json"
     }
     
     score = analysis.get('visibility_score', 0)
+    brand = analysis.get('brand_name', '')
+    
+    # Score history, trends and deltas from the local time series
+    history = [{'date': 'Current', 'score': score}]
+    changes = {}
+    if history_store:
+        history_store.record(analysis, run_id)
+        history = [{'date': h['date'], 'score': h['score']} for h in history_store.history(brand)]
+        changes = {p: history_store.changes(brand, p, run_id) for p in analysis.get('platforms_summary', {})}
 
     # Build platforms_json
     platforms_summary = analysis.get('platforms_summary', {})
     platforms_json = {}
     for p, data in platforms_summary.items():
+        change = changes.get(p, {})
         platforms_json[p] = {
             'score': data.get('score', 0),
             'mention': data.get('mention', 0),
             'sentiment': data.get('sentiment', 50),
             'recommendation': data.get('recommendation', 0),
-            'trend': 'flat'
+            'score_ci': data.get('score_ci'),
+            'mention_ci': data.get('mention_ci'),
+            'mention_rate': data.get('mention_rate'),
+            'mention_rate_ci': data.get('mention_rate_ci'),
+            'trend': change.get('trend', 'flat'),
+            'delta': change.get('delta'),
+            'period_delta': change.get('period_delta'),
+            'available': data.get('available', True)
         }
     
     # Build share_of_voice_json
@@ -397,7 +2088,7 @@ def save_dashboard_output(analysis: dict, run_id: str, session_id: str, brand_lo
         "question_breakdown_json": json.dumps(analysis.get('question_breakdown', [])),
         "brand_rankings_json": json.dumps(brand_rankings),
         "executive_summary_json": json.dumps(analysis.get('executive_summary', {})),
-        "history_json": json.dumps([{'date': 'Current', 'score': score}])
+        "history_json": json.dumps(history)
     }
     
     # Only add numeric fields if they have non-zero values
@@ -410,7 +2101,9 @@ def save_dashboard_output(analysis: dict, run_id: str, session_id: str, brand_lo
     
     record = {"fields": fields}
     
-    response = requests.post(url, headers=headers, json={"records": [record]})
+    # Upsert on run_id so a re-sent dashboard record replaces the earlier one
+    payload = {"records": [record], "performUpsert": {"fieldsToMergeOn": ["run_id"]}}
+    response = send_with_retry('airtable', 'PATCH', url, headers=headers, json=payload)
     
     if response.status_code == 200:
         return response.json().get('records', [{}])[0]
@@ -419,173 +2112,875 @@ def save_dashboard_output(analysis: dict, run_id: str, session_id: str, brand_lo
         return {}
 
 
+@cached_response('chatgpt', CHATGPT_MODEL, CHATGPT_PARAMS)
 def query_chatgpt(question: str) -> str:
     """Query ChatGPT (Step 16)"""
-    url = "https://api.openai.com/v1/chat/completions"
+    url = f"{OPENAI_API_BASE}/chat/completions"
     headers = {
         "Authorization": f"Bearer {OPENAI_API_KEY}",
         "Content-Type": "application/json"
     }
     payload = {
-        "model": "gpt-4o",
+        "model": CHATGPT_MODEL,
         "messages": [{"role": "user", "content": question}],
-        "max_tokens": 2048
+        **CHATGPT_PARAMS
     }
-    response = requests.post(url, headers=headers, json=payload)
+    try:
+        response = send_with_retry('chatgpt', 'POST', url, tokens=estimate_tokens(question, CHATGPT_PARAMS['max_tokens']),
+                                   read_timeout=provider_timeout('chatgpt'), headers=headers, json=payload)
+    except requests.RequestException:
+        return "Error: connection"
     if response.status_code == 200:
-        return response.json()['choices'][0]['message']['content']
+        data = response.json()
+        usage = data.get('usage') or {}
+        metrics.usage('chatgpt', CHATGPT_MODEL, usage.get('prompt_tokens'), usage.get('completion_tokens'))
+        return data['choices'][0]['message']['content']
     return f"Error: {response.status_code}"
 
 
+_claude_client = None
+_claude_client_lock = threading.Lock()
+
+
+def get_claude_client():
+    """The Claude client, built on first use (the SDK keeps its own pooled httpx client and honors Retry-After)"""
+    global _claude_client
+    if _claude_client is None:
+        with _claude_client_lock:
+            if _claude_client is None:
+                _claude_client = anthropic.Anthropic(timeout=HTTP_READ_TIMEOUT, max_retries=MAX_RETRIES)
+    return _claude_client
+
+
+def create_message(provider: str, **kwargs):
+    """Claude messages.create, timed and with its token usage recorded under `provider`"""
+    start = time.perf_counter()
+    try:
+        response = get_claude_client().messages.create(**kwargs)
+    except anthropic.APIStatusError as e:
+        metrics.request(provider, time.perf_counter() - start, e.status_code)
+        raise
+    except anthropic.APIConnectionError:
+        metrics.request(provider, time.perf_counter() - start, 'connection')
+        raise
+    metrics.request(provider, time.perf_counter() - start, 200)
+    record_latency(provider, time.perf_counter() - start)
+    usage = response.usage
+    metrics.usage(provider, kwargs['model'], usage.input_tokens, usage.output_tokens,
+                  getattr(usage, 'cache_read_input_tokens', 0), getattr(usage, 'cache_creation_input_tokens', 0))
+    return response
+
+
+@cached_response('claude', CLAUDE_MODEL, CLAUDE_PARAMS)
 def query_claude(question: str) -> str:
     """Query Claude (Step 17)"""
-    response = client.messages.create(
-        model="claude-sonnet-4-20250514",
-        max_tokens=2048,
-        messages=[{"role": "user", "content": question}]
-    )
+    rate_limiter.acquire('claude', estimate_tokens(question, CLAUDE_PARAMS['max_tokens']))
+    try:
+        response = create_message(
+            'claude',
+            model=CLAUDE_MODEL,
+            messages=[{"role": "user", "content": question}],
+            timeout=provider_timeout('claude'),
+            **CLAUDE_PARAMS
+        )
+    except anthropic.APIStatusError as e:
+        return f"Error: {e.status_code}"
+    except anthropic.APIConnectionError:
+        return "Error: connection"
     return response.content[0].text
 
 
+@cached_response('gemini', GEMINI_MODEL, GEMINI_PARAMS)
 def query_gemini(question: str) -> str:
     """Query Gemini (Step 18)"""
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent?key={GEMINI_API_KEY}"
+    url = f"{GEMINI_API_BASE}/models/{GEMINI_MODEL}:generateContent?key={GEMINI_API_KEY}"
     headers = {"Content-Type": "application/json"}
     payload = {
-        "contents": [{"parts": [{"text": question}]}]
+        "contents": [{"parts": [{"text": question}]}],
+        **GEMINI_PARAMS
     }
-    response = requests.post(url, headers=headers, json=payload)
+    try:
+        response = send_with_retry('gemini', 'POST', url, tokens=estimate_tokens(question),
+                                   read_timeout=provider_timeout('gemini'), headers=headers, json=payload)
+    except requests.RequestException:
+        return "Error: connection"
     if response.status_code == 200:
-        return response.json()['candidates'][0]['content']['parts'][0]['text']
+        data = response.json()
+        usage = data.get('usageMetadata') or {}
+        metrics.usage('gemini', GEMINI_MODEL, usage.get('promptTokenCount'), usage.get('candidatesTokenCount'))
+        return data['candidates'][0]['content']['parts'][0]['text']
     return f"Error: {response.status_code}"
 
 
+@cached_response('perplexity', PERPLEXITY_MODEL, PERPLEXITY_PARAMS)
 def query_perplexity(question: str) -> str:
     """Query Perplexity (Step 19)"""
-    url = "https://api.perplexity.ai/chat/completions"
+    url = f"{PERPLEXITY_API_BASE}/chat/completions"
     headers = {
         "Authorization": f"Bearer {PERPLEXITY_API_KEY}",
         "Content-Type": "application/json"
     }
     payload = {
-        "model": "llama-3.1-sonar-large-128k-online",
-        "messages": [{"role": "user", "content": question}]
+        "model": PERPLEXITY_MODEL,
+        "messages": [{"role": "user", "content": question}],
+        **PERPLEXITY_PARAMS
     }
-    response = requests.post(url, headers=headers, json=payload)
+    try:
+        response = send_with_retry('perplexity', 'POST', url, tokens=estimate_tokens(question),
+                                   read_timeout=provider_timeout('perplexity'), headers=headers, json=payload)
+    except requests.RequestException:
+        return "Error: connection"
     if response.status_code == 200:
-        return response.json()['choices'][0]['message']['content']
+        data = response.json()
+        usage = data.get('usage') or {}
+        metrics.usage('perplexity', PERPLEXITY_MODEL, usage.get('prompt_tokens'), usage.get('completion_tokens'))
+        return data['choices'][0]['message']['content']
     return f"Error: {response.status_code}"
 
 
-def analyze_responses(brand_name: str, key_messages: list, competitors: list, 
-                      question: str, responses: dict) -> dict:
-    """Claude analyzes all 4 LLM responses (Step 20)"""
-    
-    prompt = f"""You are analyzing AI responses for brand visibility.
-BRAND: {brand_name}
-KEY MESSAGES: {key_messages}
-COMPETITORS: {competitors}
-QUESTION: {question}
-RESPONSES:
-ChatGPT: {responses['chatgpt']}
-Claude: {responses['claude']}
-Gemini: {responses['gemini']}
-Perplexity: {responses['perplexity']}
-
-Score each response (0-100) on:
+SCORING_RUBRIC = """Score each response (0-100) on:
 - mention: Was the brand mentioned? (0=no, 100=yes prominently)
 - position: Where was brand positioned? (100=first, 75=second, 50=mentioned, 0=absent)
 - sentiment: How positive? (0=negative, 50=neutral, 100=positive)
 - recommendation: Was it recommended? (0=no, 100=explicitly recommended)
 - message_alignment: Did it reflect key messages? (0-100)
-- overall: Weighted average
+- overall: Weighted average"""
 
-Return ONLY valid JSON:
-{{
-  "chatgpt": {{"mention":0,"position":0,"sentiment":0,"recommendation":0,"message_alignment":0,"overall":0,"competitors_mentioned":"","notes":""}},
-  "claude": {{"mention":0,"position":0,"sentiment":0,"recommendation":0,"message_alignment":0,"overall":0,"competitors_mentioned":"","notes":""}},
-  "gemini": {{"mention":0,"position":0,"sentiment":0,"recommendation":0,"message_alignment":0,"overall":0,"competitors_mentioned":"","notes":""}},
-  "perplexity": {{"mention":0,"position":0,"sentiment":0,"recommendation":0,"message_alignment":0,"overall":0,"competitors_mentioned":"","notes":""}}
-}}"""
+PLATFORM_SCORE_TEMPLATE = '{"mention":0,"position":0,"sentiment":0,"recommendation":0,"message_alignment":0,"overall":0,"competitors_mentioned":"","notes":""}'
 
-    response = client.messages.create(
-        model="claude-sonnet-4-20250514",
-        max_tokens=2048,
-        messages=[{"role": "user", "content": prompt}]
-    )
+
+def analysis_prefix(brand_name: str, key_messages: list, competitors: list) -> str:
+    """Static part of every analysis prompt in a run: task, brand context and rubric"""
+    return f"""You are analyzing AI responses for brand visibility.
+BRAND: {brand_name}
+KEY MESSAGES: {key_messages}
+COMPETITORS: {competitors}
+
+{SCORING_RUBRIC}"""
+
+
+def claude_complete(prompt: str, max_tokens: int, prefix: str = '') -> str:
+    """Send a single-turn prompt to the analysis model and return the text reply
     
-    # Parse JSON (Step 21)
-    raw = response.content[0].text
+    With ANALYSIS_PROMPT_CACHE, a prefix long enough to be cached goes in a cached system block;
+    otherwise it leads the prompt.
+    """
+    rate_limiter.acquire('claude', estimate_tokens(prefix + prompt, max_tokens))
+    kwargs = {}
+    if prefix and ANALYSIS_PROMPT_CACHE and estimate_tokens(prefix) >= ANALYSIS_CACHE_MIN_TOKENS:
+        kwargs['system'] = [{"type": "text", "text": prefix, "cache_control": {"type": "ephemeral"}}]
+    elif prefix:
+        prompt = f"{prefix}\n\n{prompt}"
+    response = create_message(
+        'claude_analysis',
+        model=ANALYSIS_MODEL,
+        max_tokens=max_tokens,
+        messages=[{"role": "user", "content": prompt}],
+        **kwargs
+    )
+    return response.content[0].text
+
+
+def offline_complete(prompt: str, max_tokens: int) -> str:
+    """Local stand-in for the analysis endpoint: echoes the prompt's zero-score JSON template"""
+    return prompt[prompt.rfind('Return ONLY valid JSON'):].split('\n', 1)[1]
+
+
+def analysis_complete(prompt: str, max_tokens: int, prefix: str = '') -> str:
+    if ANALYSIS_OFFLINE:
+        return offline_complete(prompt, max_tokens)
+    return claude_complete(prompt, max_tokens, prefix)
+
+
+def _scan_json(text: str, start: int = 0):
+    """Walk JSON text from `start`: (index just past the first complete top-level value or None,
+    whether the walk ended inside a string, the stack of unclosed brackets)"""
+    stack = []
+    in_string = escaped = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in '{[':
+            stack.append('}' if ch == '{' else ']')
+        elif ch in '}]' and stack:
+            stack.pop()
+            if not stack:
+                return i + 1, False, []
+    return None, in_string, stack
+
+
+def repair_json(raw: str) -> str:
+    """Fix common model JSON faults locally: code fences and prose around the object, smart quotes,
+    Python literals, trailing commas, and output cut off before its closing brackets"""
+    cleaned = raw.replace('```json', '').replace('```', '').strip()
+    start = cleaned.find('{')
+    if start == -1:
+        return cleaned
+    cleaned = cleaned[start:].replace('“', '"').replace('”', '"')
+    cleaned = re.sub(r'(:\s*)True\b', r'\1true', cleaned)
+    cleaned = re.sub(r'(:\s*)False\b', r'\1false', cleaned)
+    cleaned = re.sub(r'(:\s*)None\b', r'\1null', cleaned)
+    cleaned = re.sub(r',\s*([}\]])', r'\1', cleaned)
+    
+    end, in_string, stack = _scan_json(cleaned)
+    if end is not None:
+        return cleaned[:end]
+    
+    # Truncated: drop the unfinished trailing member until the closed-up text parses
+    for _ in range(50):
+        end, in_string, stack = _scan_json(cleaned)
+        closed = cleaned + ('"' if in_string else '')
+        closed = re.sub(r'[,:]\s*$', '', closed.rstrip()) + ''.join(reversed(stack))
+        try:
+            json.loads(closed)
+            return closed
+        except json.JSONDecodeError:
+            cut = cleaned.rfind(',')
+            if cut <= 0:
+                return closed
+            cleaned = cleaned[:cut]
+    return cleaned
+
+
+def extract_json(raw: str):
+    """Parse the JSON object out of a model reply, repairing common formatting faults"""
     cleaned = raw.replace('```json', '').replace('```', '').strip()
     first_brace = cleaned.find('{')
     last_brace = cleaned.rfind('}')
     if first_brace != -1 and last_brace != -1:
-        cleaned = cleaned[first_brace:last_brace + 1]
+        try:
+            return json.loads(cleaned[first_brace:last_brace + 1])
+        except json.JSONDecodeError:
+            pass
+    return json.loads(repair_json(raw))
+
+
+def coerce_platform_score(block):
+    """Schema check for one platform's score block
     
-    return json.loads(cleaned)
+    Score fields must be numbers (numeric strings such as "80" or "80%" are accepted); returns the
+    normalized block, or None if the block is unusable.
+    """
+    if not isinstance(block, dict):
+        return None
+    cleaned = dict(block)
+    for f in SCORE_FIELDS:
+        value = block.get(f)
+        if isinstance(value, str):
+            try:
+                value = float(value.strip().rstrip('%'))
+            except ValueError:
+                return None
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return None
+        cleaned[f] = value
+    competitors = block.get('competitors_mentioned')
+    cleaned['competitors_mentioned'] = ', '.join(map(str, competitors)) if isinstance(competitors, list) else str(competitors or '')
+    cleaned['notes'] = str(block.get('notes') or '')
+    return cleaned
 
 
-def run_tracker_loop(questions: list, brand_name: str, key_messages: list, 
-                     competitors: list, run_id: str, customer_id: str) -> list:
-    """Main loop: query all LLMs for each question, analyze, return results (Steps 15-21)"""
+def parse_platform_scores(raw: str) -> dict:
+    """Every valid platform score block in an analysis reply, keyed by (item number or None, platform)
+    
+    A reply that parses (after repair) is read whole; otherwise, or for blocks it lacks, each
+    `"<platform>": {...}` object is parsed on its own so one bad block does not lose the others.
+    """
+    blocks = {}
+    try:
+        parsed = extract_json(raw)
+    except json.JSONDecodeError:
+        parsed = None
+    if isinstance(parsed, dict):
+        items = {k: v for k, v in parsed.items() if k.isdigit() and isinstance(v, dict)}
+        for item, platforms in (items.items() if items else [(None, parsed)]):
+            for p in PLATFORMS:
+                block = coerce_platform_score(platforms.get(p))
+                if block:
+                    blocks[(item, p)] = block
+    
+    item = None
+    for match in re.finditer(r'"(\d+|' + '|'.join(PLATFORMS) + r')"\s*:\s*\{', raw):
+        key = match.group(1)
+        if key.isdigit():
+            item = key
+            continue
+        if (item, key) in blocks:
+            continue
+        end, _, _ = _scan_json(raw, match.end() - 1)
+        if end is None:
+            continue
+        try:
+            block = coerce_platform_score(json.loads(repair_json(raw[match.end() - 1:end])))
+        except json.JSONDecodeError:
+            continue
+        if block:
+            blocks[(item, key)] = block
+    return blocks
+
+
+class LocalPrescorer:
+    """Deterministic scan of raw response text for the brand (and its variations) and competitors"""
+    
+    def __init__(self, brand_name: str, brand_variations: list = None, competitors: list = None):
+        self.brand_terms = {t.lower().strip() for t in [brand_name] + list(brand_variations or []) if t and t.strip()}
+        self.competitor_names = {}
+        for name in competitors or []:
+            key = name.lower().strip() if name else ''
+            if key and key not in self.brand_terms:
+                self.competitor_names.setdefault(key, name.strip())
+        
+        terms = sorted(self.brand_terms | set(self.competitor_names), key=len, reverse=True)
+        self.pattern = re.compile(r'(?<!\w)(' + '|'.join(re.escape(t) for t in terms) + r')(?!\w)',
+                                  re.IGNORECASE) if terms else None
+    
+    def score(self, text: str) -> dict:
+        """Mention, first-mention position (rubric scale) and competitors named, from the text alone"""
+        first_seen = []
+        brand_found = False
+        competitors_found = []
+        if self.pattern and text:
+            for match in self.pattern.finditer(text):
+                term = match.group(1).lower()
+                entity = 'brand' if term in self.brand_terms else self.competitor_names[term]
+                if entity in first_seen:
+                    continue
+                first_seen.append(entity)
+                if entity == 'brand':
+                    brand_found = True
+                else:
+                    competitors_found.append(entity)
+        
+        if not brand_found:
+            position = 0
+        else:
+            position = {0: 100, 1: 75}.get(first_seen.index('brand'), 50)
+        return {
+            'mention': 100 if brand_found else 0,
+            'position': position,
+            'competitors_mentioned': ', '.join(competitors_found),
+            'brand_mentioned': brand_found
+        }
+    
+    def trim(self, text: str, window: int) -> str:
+        """Only the passages within `window` characters of a brand or competitor mention, in order"""
+        if not self.pattern or not text:
+            return text
+        spans = []
+        for match in self.pattern.finditer(text):
+            start, end = max(0, match.start() - window), min(len(text), match.end() + window)
+            if spans and start <= spans[-1][1]:
+                spans[-1][1] = end
+            else:
+                spans.append([start, end])
+        if not spans:
+            return text
+        # Widen each passage to whole words
+        passages = []
+        for start, end in spans:
+            if start > 0:
+                space = text.rfind(' ', 0, start)
+                start = space + 1 if space != -1 else 0
+            space = text.find(' ', end)
+            end = space if space != -1 else len(text)
+            passages.append(text[start:end].strip())
+        trimmed = ' [...] '.join(passages)
+        if spans[0][0] > 0:
+            trimmed = '[...] ' + trimmed
+        if spans[-1][1] < len(text):
+            trimmed += ' [...]'
+        return trimmed if len(trimmed) < len(text) else text
+
+
+def split_scorable(responses: dict, prescorer: LocalPrescorer = None) -> tuple:
+    """Separate responses worth sending to Claude from those scored without it
+    
+    Error responses get an empty score block; unavailable platforms are also flagged
+    available=False so aggregation leaves them out. With a prescorer, responses that never name the
+    brand get zero brand scores plus the competitors found locally.
+    """
+    scored = {}
+    skipped = {}
+    for p, text in responses.items():
+        if is_unavailable_response(text):
+            skipped[p] = empty_platform_score("Platform unavailable (circuit open)")
+            skipped[p]['available'] = False
+            continue
+        if is_error_response(text):
+            skipped[p] = empty_platform_score(f"No response ({text or 'empty'})")
+            continue
+        if prescorer:
+            local = prescorer.score(text)
+            if not local['brand_mentioned']:
+                skipped[p] = empty_platform_score("Brand not mentioned (local pre-score)")
+                skipped[p]['competitors_mentioned'] = local['competitors_mentioned']
+                continue
+        scored[p] = text
+    return scored, skipped
+
+
+def trim_scored(scored: dict, matcher: LocalPrescorer) -> dict:
+    """Apply relevance trimming (ANALYSIS_TRIM_ENABLED) to the responses going to Claude"""
+    if not ANALYSIS_TRIM_ENABLED:
+        return scored
+    trimmed = {p: matcher.trim(text, ANALYSIS_TRIM_WINDOW) for p, text in scored.items()}
+    saved = sum(len(scored[p]) - len(trimmed[p]) for p in scored) // 4
+    if saved:
+        metrics.inc('tracker_trimmed_tokens_total', saved)
+    return trimmed
+
+
+def analyze_responses(brand_name: str, key_messages: list, competitors: list, 
+                      question: str, responses: dict, prescorer: LocalPrescorer = None,
+                      attempts: int = None) -> dict:
+    """Claude analyzes all 4 LLM responses (Step 20)
+    
+    Only responses that need judgement are sent (see split_scorable); if none do, no call is made.
+    Valid platform blocks are kept even when the reply is broken; platforms still missing are
+    re-requested on their own (up to ANALYSIS_REPAIR_ATTEMPTS times), then scored empty.
+    """
+    
+    scored, skipped = split_scorable(responses, prescorer)
+    if not scored:
+        return skipped
+    scored = trim_scored(scored, prescorer or LocalPrescorer(brand_name, None, competitors))
+    
+    response_lines = '\n'.join(f"{PLATFORM_NAMES[p]}: {text}" for p, text in scored.items())
+    json_template = ',\n'.join(f'  "{p}": {PLATFORM_SCORE_TEMPLATE}' for p in scored)
+    
+    prompt = f"""QUESTION: {question}
+RESPONSES:
+{response_lines}
+
+Return ONLY valid JSON:
+{{
+{json_template}
+}}"""
+
+    # Parse JSON (Step 21)
+    prefix = analysis_prefix(brand_name, key_messages, competitors)
+    blocks = parse_platform_scores(analysis_complete(prompt, 2048, prefix))
+    analysis = {p: blocks[(None, p)] for p in scored if (None, p) in blocks}
+    missing = [p for p in scored if p not in analysis]
+    if missing:
+        analysis.update(reanalyze_missing(brand_name, key_messages, competitors, question, responses, missing,
+                                          prescorer, ANALYSIS_REPAIR_ATTEMPTS if attempts is None else attempts))
+    analysis.update(skipped)
+    return analysis
+
+
+def reanalyze_missing(brand_name: str, key_messages: list, competitors: list, question: str, responses: dict,
+                      missing: list, prescorer: LocalPrescorer, attempts: int) -> dict:
+    """Score blocks for platforms a reply left out or got wrong: a reduced call for just those
+    platforms while attempts remain, else empty blocks noting the failure"""
+    names = ', '.join(PLATFORM_NAMES[p] for p in missing)
+    if attempts > 0:
+        metrics.inc('tracker_analysis_repairs_total', len(missing), outcome='reask')
+        print(f"  Re-analyzing {names}: missing or invalid JSON")
+        return analyze_responses(brand_name, key_messages, competitors, question,
+                                 {p: responses[p] for p in missing}, prescorer, attempts - 1)
+    metrics.inc('tracker_analysis_repairs_total', len(missing), outcome='failed')
+    print(f"  Analysis failed for {names}: no valid JSON")
+    return {p: empty_platform_score("Analysis failed (invalid JSON)") for p in missing}
+
+
+def analyze_responses_batch(brand_name: str, key_messages: list, competitors: list, items: list,
+                            prescorer: LocalPrescorer = None) -> list:
+    """Score several questions' responses in one Claude call (Steps 20-21, batched)
+    
+    `items` is a list of (question, responses) pairs; returns one analysis dict per item.
+    Valid platform blocks are salvaged from the reply; only the platforms an item is still missing
+    are re-requested, in a single-question call.
+    """
+    
+    if len(items) == 1:
+        question, responses = items[0]
+        return [analyze_responses(brand_name, key_messages, competitors, question, responses, prescorer)]
+    
+    splits = [split_scorable(responses, prescorer) for _, responses in items]
+    batch_ids = [n for n, (scored, _) in enumerate(splits) if scored]
+    
+    blocks = {}
+    if batch_ids:
+        matcher = prescorer or LocalPrescorer(brand_name, None, competitors)
+        item_blocks = []
+        json_blocks = []
+        for n in batch_ids:
+            scored = trim_scored(splits[n][0], matcher)
+            response_lines = '\n'.join(f"{PLATFORM_NAMES[p]}: {text}" for p, text in scored.items())
+            item_blocks.append(f"### ITEM {n + 1}\nQUESTION: {items[n][0]}\nRESPONSES:\n{response_lines}")
+            platform_lines = ',\n'.join(f'    "{p}": {PLATFORM_SCORE_TEMPLATE}' for p in scored)
+            json_blocks.append(f'  "{n + 1}": {{\n{platform_lines}\n  }}')
+        item_text = '\n\n'.join(item_blocks)
+        json_template = ',\n'.join(json_blocks)
+        
+        prompt = f"""Each ITEM below is one question and the AI responses to it. Score every response independently.
+
+{item_text}
+
+Return ONLY valid JSON, keyed by item number:
+{{
+{json_template}
+}}"""
+
+        prefix = analysis_prefix(brand_name, key_messages, competitors)
+        blocks = parse_platform_scores(analysis_complete(prompt, ANALYSIS_MAX_TOKENS_PER_QUESTION * len(batch_ids), prefix))
+    
+    analyses = []
+    for n, (scored, skipped) in enumerate(splits):
+        if not scored:
+            analyses.append(skipped)
+            continue
+        item = str(n + 1)
+        analysis = {p: blocks[(item, p)] for p in scored if (item, p) in blocks}
+        missing = [p for p in scored if p not in analysis]
+        if missing:
+            question, responses = items[n]
+            analysis.update(reanalyze_missing(brand_name, key_messages, competitors, question, responses, missing,
+                                              prescorer, ANALYSIS_REPAIR_ATTEMPTS))
+        analysis.update(skipped)
+        analyses.append(analysis)
+    return analyses
+
+
+PROVIDER_QUERIES = {
+    'chatgpt': query_chatgpt,
+    'claude': query_claude,
+    'gemini': query_gemini,
+    'perplexity': query_perplexity
+}
+
+def query_provider(platform: str, question: str, sample: int = 0) -> str:
+    """Query one provider (cached, coalesced, and limited to its concurrency slots); sample > 0 is a repeat draw"""
+    if sample:
+        return PROVIDER_QUERIES[platform](question, sample)
+    return PROVIDER_QUERIES[platform](question)
+
+
+def query_all_providers(question: str, pool: ThreadPoolExecutor, known: dict = None, on_response=None) -> dict:
+    """Fan a question out to all 4 LLMs at once (Steps 16-19)
+    
+    Platforms already in `known` are not queried again; `on_response(platform, text)` is called
+    as each new response arrives.
+    """
+    known = known or {}
+    futures = {p: pool.submit(query_provider, p, question) for p in PLATFORMS if p not in known}
+    responses = dict(known)
+    for p, f in futures.items():
+        responses[p] = f.result()
+        if on_response:
+            on_response(p, responses[p])
+    return {p: responses[p] for p in PLATFORMS}
+
+
+def sample_all_providers(question: str, pool: ThreadPoolExecutor, matcher: LocalPrescorer,
+                         known: dict = None, on_response=None) -> tuple:
+    """Ask all 4 LLMs a question repeatedly until each platform's mention rate is pinned down
     
-    results = []
+    Each round puts every platform's next draws in flight at once: SAMPLE_MIN to start, then
+    SAMPLE_BATCH at a time. A platform stops once the Wilson interval of its mention rate is at
+    most SAMPLE_CI_WIDTH wide, after SAMPLE_MAX attempts, or when it is unavailable.
     
-    for i, q in enumerate(questions):
+    Returns (responses, samples): per platform the first usable answer, which is scored and stored
+    as in query_all_providers, and {'n': answers drawn, 'mentions': answers naming the brand}.
+    Platforms in `known` count that answer as their first sample.
+    """
+    min_samples = max(1, SAMPLE_MIN)
+    max_samples = max(min_samples, SAMPLE_MAX)
+    responses = dict(known or {})
+    samples = {p: {'n': 0, 'mentions': 0} for p in PLATFORMS}
+    attempts = {p: 0 for p in PLATFORMS}
+    finished = set()
+    
+    def add(p, text):
+        if is_unavailable_response(text):
+            finished.add(p)
+        elif not is_error_response(text):
+            samples[p]['n'] += 1
+            samples[p]['mentions'] += matcher.score(text)['brand_mentioned']
+    
+    for p, text in responses.items():
+        attempts[p] = 1
+        add(p, text)
+    
+    while True:
+        draws = {}
+        for p in PLATFORMS:
+            if p in finished:
+                continue
+            n = samples[p]['n']
+            if n >= min_samples:
+                low, high = wilson_interval(samples[p]['mentions'], n)
+                if high - low <= SAMPLE_CI_WIDTH:
+                    finished.add(p)
+                    continue
+            want = min(min_samples - n if n < min_samples else max(1, SAMPLE_BATCH), max_samples - attempts[p])
+            if want <= 0:
+                finished.add(p)
+                continue
+            for k in range(attempts[p], attempts[p] + want):
+                draws[p, k] = pool.submit(query_provider, p, question, k)
+            attempts[p] += want
+            metrics.inc('tracker_samples_total', want, provider=p)
+        if not draws:
+            break
+        for (p, k), future in draws.items():
+            text = future.result()
+            # Keep the earliest usable answer for scoring; an error only stands in until one arrives
+            if p not in responses or (is_error_response(responses[p]) and not is_error_response(text)):
+                responses[p] = text
+                if on_response:
+                    on_response(p, text)
+            add(p, text)
+    
+    for p in PLATFORMS:
+        if not is_unavailable_response(responses.get(p, '')):
+            metrics.inc('tracker_samples_saved_total', max_samples - attempts[p], provider=p)
+    return {p: responses[p] for p in PLATFORMS}, samples
+
+
+def apply_samples(analysis: dict, samples: dict) -> dict:
+    """Copy of a question's analysis carrying each platform's sample counts, with the mention score
+    replaced by the sampled mention rate (0-100)"""
+    if not samples:
+        return analysis
+    analysis = dict(analysis)
+    for p, counts in samples.items():
+        if counts['n']:
+            block = analysis.get(p) if isinstance(analysis.get(p), dict) else {}
+            analysis[p] = dict(block, mention=round(counts['mentions'] / counts['n'] * 100, 1),
+                               samples=counts['n'], sample_mentions=counts['mentions'])
+    return analysis
+
+
+def iter_tracker_results(questions: list, brand_name: str, key_messages: list, 
+                         competitors: list, run_id: str, customer_id: str,
+                         brand_variations: list = None, valid_competitors: list = None,
+                         journal: RunJournal = None):
+    """Query all LLMs for each question and analyze, yielding results in question order (Steps 15-21)
+    
+    At most QUESTION_CONCURRENCY questions are being queried at once, each fanned out to all
+    providers at once. Answered questions are grouped ANALYSIS_BATCH_SIZE at a time for scoring,
+    so memory stays bounded by the window rather than the run size.
+    
+    brand_variations and valid_competitors (from define_industry) feed the local pre-scorer.
+    With a journal, responses and analyses already recorded are reused and new ones recorded.
+    With SAMPLING_ENABLED each platform is sampled repeatedly (sample_all_providers).
+    """
+    
+    prescorer = None
+    if LOCAL_PRESCORE_ENABLED:
+        prescorer = LocalPrescorer(brand_name, brand_variations, list(valid_competitors or []) + list(competitors or []))
+    matcher = prescorer or LocalPrescorer(brand_name, brand_variations)
+    sampled = {}
+    
+    def query_question(i, q):
         print(f"  Processing question {i+1}/{len(questions)}: {q['text'][:50]}...")
+        known = None
+        if journal is not None:
+            known = journal.responses.get(i)
+            if i in journal.analyses:
+                # Already scored: platforms that failed then were scored as such, so asking them
+                # again would be paid for and never used
+                return i, q, {p: (known or {}).get(p, '') for p in PLATFORMS}
+            
+            def record(platform, text):
+                # Errors are not journaled so a resumed run asks again
+                if not is_error_response(text):
+                    journal.record_response(i, platform, text)
+        else:
+            record = None
         
         # Query all 4 LLMs (Steps 16-19)
-        responses = {
-            'chatgpt': query_chatgpt(q['text']),
-            'claude': query_claude(q['text']),
-            'gemini': query_gemini(q['text']),
-            'perplexity': query_perplexity(q['text'])
-        }
+        with metrics.span('query'):
+            if SAMPLING_ENABLED:
+                responses, sampled[i] = sample_all_providers(q['text'], provider_pool, matcher, known, record)
+                return i, q, responses
+            return i, q, query_all_providers(q['text'], provider_pool, known, record)
+    
+    def analyze_batch(answered):
+        # Analyze responses (Step 20-21), reusing analyses a previous attempt already paid for
+        done = journal.analyses if journal else {}
+        todo = [(i, q, responses) for i, q, responses in answered if i not in done]
+        items = [(q['text'], responses) for _, q, responses in todo]
+        fresh = []
+        if items:
+            with metrics.span('analysis'):
+                fresh = analyze_responses_batch(brand_name, key_messages, competitors, items, prescorer)
+        fresh = {i: apply_samples(analysis, sampled.pop(i, None)) for (i, _, _), analysis in zip(todo, fresh)}
+        if journal:
+            for i, analysis in fresh.items():
+                journal.record_analysis(i, analysis)
+        analyses = [done[i] if i in done else fresh[i] for i, _, _ in answered]
         
-        # Analyze responses (Step 20-21)
-        analysis = analyze_responses(brand_name, key_messages, competitors, q['text'], responses)
+        # Build result records
+        return [QuestionResult(
+            run_id=run_id,
+            customer_id=customer_id,
+            run_date=datetime.now().strftime('%Y-%m-%d'),
+            brand_name=brand_name,
+            question_text=q['text'],
+            question_category=q['category'],
+            scores={p: PlatformScore.from_dict(analysis.get(p)) for p in PLATFORMS},
+            **stored_responses(responses)
+        ) for (_, q, responses), analysis in zip(answered, analyses)]
+    
+    batch_size = max(1, ANALYSIS_BATCH_SIZE)
+    question_workers = max(1, min(max(QUESTION_CONCURRENCY, batch_size), len(questions)))
+    provider_workers = sum(max(1, n) for n in PROVIDER_CONCURRENCY.values())
+    analysis_workers = max(1, question_workers // batch_size)
+    
+    with ContextThreadPool(max_workers=provider_workers) as provider_pool, \
+         ContextThreadPool(max_workers=question_workers) as question_pool, \
+         ContextThreadPool(max_workers=analysis_workers) as analysis_pool:
+        upcoming = iter(enumerate(questions))
+        querying = deque()
+        analyzing = deque()
+        answered = []
         
-        # Build result record
-        result = {
-            'run_id': run_id,
-            'customer_id': customer_id,
-            'run_date': datetime.now().strftime('%Y-%m-%d'),
-            'brand_name': brand_name,
-            'question_text': q['text'],
-            'question_category': q['category'],
-            'chatgpt_response': responses['chatgpt'],
-            'claude_response': responses['claude'],
-            'gemini_response': responses['gemini'],
-            'perplexity_response': responses['perplexity'],
-            'analysis': analysis
-        }
-        results.append(result)
+        def top_up():
+            while len(querying) < question_workers:
+                nxt = next(upcoming, None)
+                if nxt is None:
+                    return
+                querying.append(question_pool.submit(query_question, *nxt))
+        
+        top_up()
+        while querying or answered or analyzing:
+            if querying:
+                answered.append(querying.popleft().result())
+                top_up()
+            if answered and (len(answered) == batch_size or not querying):
+                analyzing.append(analysis_pool.submit(analyze_batch, answered))
+                answered = []
+            # Hand back finished batches in order; block on the oldest once too many are pending
+            while analyzing and (analyzing[0].done() or len(analyzing) > analysis_workers
+                                 or not (querying or answered)):
+                yield from analyzing.popleft().result()
+
+
+def stored_responses(responses: dict) -> dict:
+    """QuestionResult response fields: blob refs when the blob store is on, else the texts"""
+    if BLOB_STORE_ENABLED:
+        return {'response_refs': {p: blob_store.put(text) for p, text in responses.items()}}
+    return {'responses': responses}
+
+
+def run_tracker_loop(questions: list, brand_name: str, key_messages: list, 
+                     competitors: list, run_id: str, customer_id: str,
+                     brand_variations: list = None, valid_competitors: list = None) -> list:
+    """Main loop: query all LLMs for each question, analyze, return QuestionResult records (Steps 15-21)"""
+    return list(iter_tracker_results(questions, brand_name, key_messages, competitors, run_id, customer_id,
+                                     brand_variations, valid_competitors))
+
+
+def run_streaming_pipeline(questions: list, brand_name: str, key_messages: list, competitors: list,
+                           run_id: str, customer_id: str, session_id: str,
+                           valid_competitors: list, industry: str, brand_variations: list = None,
+                           journal: RunJournal = None) -> tuple:
+    """Query -> analyze -> persist as results arrive (Steps 15-27)
+    
+    Each full batch of AIRTABLE_BATCH_SIZE results is written to Airtable as soon as it fills,
+    on writer threads so querying keeps going. Only the slim scoring payload of each result is
+    kept for the final aggregation. Returns (run analysis, number of records saved, failed
+    Airtable batches), each failure giving its first question number, size, status and error.
+    
+    With a journal, batches already written to Airtable are skipped, so a resumed run does not
+    create duplicate records; failed batches are not journaled and are written again on resume.
+    """
     
-    return results
+    slim_results = []
+    batch = []
+    writes = []
+    
+    def write_batch(batch, first_number):
+        if journal and first_number in journal.airtable_batches:
+            return journal.airtable_batches[first_number], []
+        with metrics.span('airtable_write'):
+            report = save_to_airtable_report(batch, session_id, first_question_number=first_number)
+        records = report['records']
+        if journal and len(records) == len(batch):
+            journal.record_airtable_batch(first_number, [r.get('id') for r in records])
+        failures = [{'first_question_number': b['label'], 'size': b['size'], 'status': b['status'], 'error': b['error']}
+                    for b in report['batches'] if not b['ok']]
+        return records, failures
+    
+    with ContextThreadPool(max_workers=max(1, AIRTABLE_WRITE_CONCURRENCY)) as writer:
+        for result in iter_tracker_results(questions, brand_name, key_messages, competitors, run_id, customer_id,
+                                           brand_variations, valid_competitors, journal):
+            batch.append(result)
+            slim_results.append(result.slim())
+            if len(batch) == AIRTABLE_BATCH_SIZE:
+                writes.append(writer.submit(write_batch, batch, len(slim_results) - len(batch) + 1))
+                batch = []
+        if batch:
+            writes.append(writer.submit(write_batch, batch, len(slim_results) - len(batch) + 1))
+        written = [w.result() for w in writes]
+    saved_count = sum(len(records) for records, _ in written)
+    failed_batches = [failure for _, failures in written for failure in failures]
+    
+    with metrics.span('aggregate'):
+        analysis = analyze_run_data(slim_results, brand_name, valid_competitors, industry, brand_variations)
+    return analysis, saved_count, failed_batches
+
+
+def normalize_domain(domain: str) -> str:
+    """Extract the bare domain from a URL or domain the user typed"""
+    if not domain:
+        return ''
+    return domain.strip().lower().replace('https://', '').replace('http://', '').replace('www.', '').split('/')[0]
+
+
+def _cached_brand_lookup(domain: str) -> dict:
+    """Brand.dev raw response and parsed assets for a normalized domain, via cache and single-flight"""
+    cached = brand_cache.get(domain)
+    if cached is not None:
+        return cached
+    
+    def fetch():
+        url = f"{BRAND_DEV_API_BASE}/brand/retrieve?domain={domain}"
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {BRAND_DEV_API_KEY}"
+        }
+        
+        try:
+            response = send_with_retry('brand_dev', 'GET', url, headers=headers)
+            if response.status_code != 200:
+                return {'raw': {"error": f"Brand.dev API error: {response.status_code}"}, 'parsed': None}
+            entry = {'raw': response.json()}
+        except (requests.RequestException, ValueError) as e:
+            # Only the dashboard logo depends on this, so a failed lookup never fails the run
+            print(f"Brand.dev lookup failed for {domain}: {e}")
+            return {'raw': {"error": f"Brand.dev API error: {e}"}, 'parsed': None}
+        entry['parsed'] = parse_brand_assets(entry['raw'])
+        brand_cache.set(domain, entry)
+        return entry
+    
+    return brand_flights.do(domain, fetch)
 
 
 def get_brand_assets(domain: str) -> dict:
     """Pull brand assets from Brand.dev API
     
-    Replaces Zapier Step 8: Pull brand assets
+    Replaces Zapier Step 8: Pull brand assets. Responses are cached per normalized domain for
+    BRAND_CACHE_TTL, and concurrent lookups of the same domain share one request.
     """
-    
-    # Extract domain from URL if full URL provided
-    if domain:
-        domain = domain.replace('https://', '').replace('http://', '').replace('www.', '').split('/')[0]
-    
-    url = f"https://api.brand.dev/v1/brand/retrieve?domain={domain}"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {BRAND_DEV_API_KEY}"
-    }
-    
-    response = requests.get(url, headers=headers)
-    
-    if response.status_code == 200:
-        return response.json()
-    else:
-        return {"error": f"Brand.dev API error: {response.status_code}"}
+    return _cached_brand_lookup(normalize_domain(domain))['raw']
+
+
+def get_parsed_brand_assets(domain: str) -> dict:
+    """Steps 8-9 together: parsed brand assets, reusing the parse stored with the cached response"""
+    entry = _cached_brand_lookup(normalize_domain(domain))
+    return entry['parsed'] if entry['parsed'] is not None else parse_brand_assets(entry['raw'])
 
 
 def parse_brand_assets(brand_data: dict) -> dict:
@@ -659,12 +3054,45 @@ def parse_brand_assets(brand_data: dict) -> dict:
     }
 
 
-def define_industry(brand_name: str, competitors: list, key_messages: list) -> dict:
+def industry_cache_key(brand_name: str, competitors: list, key_messages: list) -> str:
+    """Canonical key: brand plus sorted, de-duplicated competitors and key messages, case-folded"""
+    canonical = [
+        ' '.join((brand_name or '').lower().split()),
+        sorted({' '.join(c.lower().split()) for c in competitors or [] if c}),
+        sorted({' '.join(m.lower().split()) for m in key_messages or [] if m})
+    ]
+    return hashlib.sha256(json.dumps(canonical).encode('utf-8')).hexdigest()
+
+
+def define_industry(brand_name: str, competitors: list, key_messages: list, refresh: bool = False) -> dict:
     """Define industry using Claude API
     
-    Replaces Zapier Step 4: Define Industry (ChatGPT)
+    Replaces Zapier Step 4: Define Industry (ChatGPT). Results are memoized for
+    INDUSTRY_CACHE_TTL on the canonical (brand, competitors, key messages) key, and concurrent
+    identical requests share one Claude call. refresh=True bypasses and replaces the cached entry.
     """
     
+    key = industry_cache_key(brand_name, competitors, key_messages)
+    if not refresh:
+        cached = industry_cache.get(key)
+        if cached is not None:
+            return cached
+    
+    def resolve():
+        industry_data = _resolve_industry(brand_name, competitors, key_messages)
+        if not industry_data.get('fallback'):
+            industry_cache.set(key, industry_data)
+        return industry_data
+    
+    return industry_flights.do(key, resolve)
+
+
+def invalidate_industry(brand_name: str, competitors: list, key_messages: list) -> None:
+    """Drop the memoized define_industry result so the next run asks Claude again"""
+    industry_cache.invalidate(industry_cache_key(brand_name, competitors, key_messages))
+
+
+def _resolve_industry(brand_name: str, competitors: list, key_messages: list) -> dict:
     prompt = f"""Analyze the brand and competitors listed below. Determine the specific industry and output JSON only.
 Brand: {brand_name}
 User-Listed Competitors: {competitors}
@@ -687,22 +3115,66 @@ Rules:
 - disambiguation_term: A clarifying phrase to prevent AI misinterpretation (e.g. "market research platform" vs "AI development platform")
 JSON only. No explanation."""
 
-    response = client.messages.create(
+    reply = _industry_complete(prompt)
+    industry_data = coerce_industry(reply)
+    if industry_data is None:
+        # One reduced follow-up: ask only for the broken reply to be rewritten as valid JSON
+        metrics.inc('tracker_analysis_repairs_total', outcome='reask')
+        print("  Industry reply was not valid JSON, asking for a corrected copy")
+        reply = _industry_complete(f"""Rewrite the text below as one valid JSON object with exactly the keys {list(INDUSTRY_SCHEMA)}.
+Keep the content. JSON only. No explanation.
+
+{reply}""")
+        industry_data = coerce_industry(reply)
+    if industry_data is None:
+        metrics.inc('tracker_analysis_repairs_total', outcome='failed')
+        print("  Industry definition failed (no valid JSON), continuing with the user-listed competitors")
+        industry_data = {
+            'industry': '', 'industry_keywords': [], 'valid_competitors': [c for c in competitors or [] if c],
+            'brand_variations': [brand_name], 'invalid_inputs': [], 'disambiguation_term': '', 'fallback': True
+        }
+    return industry_data
+
+
+INDUSTRY_SCHEMA = {
+    'industry': str, 'industry_keywords': list, 'valid_competitors': list,
+    'brand_variations': list, 'invalid_inputs': list, 'disambiguation_term': str
+}
+
+
+def _industry_complete(prompt: str) -> str:
+    rate_limiter.acquire('claude', estimate_tokens(prompt, 1024))
+    response = create_message(
+        'claude_analysis',
         model="claude-sonnet-4-20250514",
         max_tokens=1024,
         messages=[{"role": "user", "content": prompt}]
     )
+    return response.content[0].text
+
+
+def coerce_industry(reply: str):
+    """Parse and schema-check a define_industry reply (after local JSON repair)
     
-    # Parse JSON from response
-    response_text = response.content[0].text.strip()
-    # Remove markdown code blocks if present
-    if response_text.startswith("```"):
-        response_text = response_text.split("```")[1]
-        if response_text.startswith("json"):
-            response_text = response_text[4:]
-    response_text = response_text.strip()
-    
-    return json.loads(response_text)
+    `industry` must be a non-empty string; list fields given as a comma-separated string are
+    split, and missing optional fields default to empty. Returns None if the reply is unusable.
+    """
+    try:
+        data = extract_json(reply)
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(data, dict) or not isinstance(data.get('industry'), str) or not data['industry'].strip():
+        return None
+    cleaned = {}
+    for key, kind in INDUSTRY_SCHEMA.items():
+        value = data.get(key)
+        if kind is list:
+            if isinstance(value, str):
+                value = value.split(',')
+            cleaned[key] = [str(v).strip() for v in value if str(v).strip()] if isinstance(value, list) else []
+        else:
+            cleaned[key] = value.strip() if isinstance(value, str) else ''
+    return cleaned
 
 def parse_webhook_input(data: dict) -> dict:
     """Parse incoming webhook data into structured format
@@ -738,8 +3210,360 @@ def parse_webhook_input(data: dict) -> dict:
     }
 
 
+def run_pipeline(run: dict, resume: bool = False) -> dict:
+    """Run the whole tracker for one parsed webhook (Steps 4-30)
+    
+    Progress is journaled under the run_id. With resume=True, industry data, brand assets,
+    provider responses, analyses and Airtable writes already in the journal are reused, so
+    only the missing calls are made and no record is written twice. Airtable batches that still
+    failed after retries are listed under 'failed_batches' and are written again on resume.
+    
+    The run's stage timings, requests, retries, tokens and estimated cost are logged as one
+    metrics event and returned under 'metrics'.
+    """
+    
+    with metrics.run_scope(run['run_id']) as run_metrics:
+        result = _run_pipeline_steps(run, resume)
+    result['metrics'] = run_metrics['summary']
+    sweep_blob_store()
+    return result
+
+
+def _run_pipeline_steps(run: dict, resume: bool) -> dict:
+    journal = RunJournal(run['run_id'], resume=resume) if RUN_JOURNAL_ENABLED else None
+    steps = journal.steps if journal else {}
+    finished = False
+    if journal and journal.run is None:
+        journal.record_run(run)
+    
+    def step(name, fn, *args):
+        if name in steps:
+            return steps[name]
+        with metrics.span(name):
+            value = fn(*args)
+        if journal:
+            journal.record_step(name, value)
+        return value
+    
+    # Steps 8-9: Pull and parse brand assets in the background; only Step 30 needs them
+    background = ContextThreadPool(max_workers=1)
+    brand_future = background.submit(step, 'brand_assets', get_parsed_brand_assets, run['website'])
+    
+    try:
+        # Steps 4-6: Define Industry
+        industry_data = step('industry', define_industry, run['brand_name'], run['competitors'], run['key_messages'])
+        
+        # Steps 15-27: Query, analyze, save question data and aggregate
+        analysis, saved_count, failed_batches = run_streaming_pipeline(
+            questions=run['questions'],
+            brand_name=run['brand_name'],
+            key_messages=run['key_messages'],
+            competitors=run['competitors'],
+            run_id=run['run_id'],
+            customer_id=run['customer_id'],
+            session_id=run['session_id'],
+            valid_competitors=industry_data.get('valid_competitors', []),
+            industry=industry_data.get('industry', ''),
+            brand_variations=industry_data.get('brand_variations', []),
+            journal=journal
+        )
+        
+        # Step 30: Save to Dashboard Output (only once per run); the logo is cosmetic, so a failed
+        # brand lookup leaves it empty rather than failing a run that is otherwise complete
+        try:
+            parsed_brand = brand_future.result() or {}
+        except Exception as e:
+            print(f"Brand assets unavailable, saving dashboard without a logo: {e}")
+            parsed_brand = {}
+        dashboard_record = steps.get('dashboard')
+        if not dashboard_record:
+            with metrics.span('dashboard'):
+                dashboard_record = save_dashboard_output(analysis, run['run_id'], run['session_id'],
+                                                         parsed_brand.get('primary_logo_url', ''))
+            if journal and dashboard_record:
+                journal.record_step('dashboard', dashboard_record)
+        # Nothing left to resume: the journal is deleted and its blobs are left to the retention sweep
+        if journal and dashboard_record and not failed_batches:
+            journal.record_step('finished', True)
+            finished = True
+    finally:
+        background.shutdown(wait=True)
+        if journal:
+            journal.close()
+    if finished:
+        journal.discard()
+    
+    return {
+        'run_id': run['run_id'],
+        'analysis': analysis,
+        'saved_records': saved_count,
+        'failed_batches': failed_batches,
+        'dashboard_record': dashboard_record
+    }
+
+
+def resume_run(run_id: str) -> dict:
+    """Resume a crashed run from its journal, re-issuing only the calls that never completed"""
+    journal = RunJournal(run_id, resume=True)
+    run = journal.run
+    if run is None:
+        journal.discard()
+        raise ValueError(f"No journal found for run {run_id} (finished runs have nothing to resume)")
+    journal.close()
+    return run_pipeline(run, resume=True)
+
+
+class JobQueue:
+    """Durable run queue in SQLite, shared by the ingestion server and worker processes"""
+    
+    def __init__(self, path: str = QUEUE_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS jobs (id INTEGER PRIMARY KEY AUTOINCREMENT, run_id TEXT UNIQUE, "
+                          "payload TEXT NOT NULL, status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+                          "error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL, worker INTEGER)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id)")
+        if 'worker' not in [row[1] for row in self.conn.execute("PRAGMA table_info(jobs)")]:
+            self.conn.execute("ALTER TABLE jobs ADD COLUMN worker INTEGER")
+        self._lock = threading.Lock()
+    
+    def enqueue(self, run: dict) -> None:
+        now = time.time()
+        with self._lock:
+            self.conn.execute("INSERT INTO jobs (run_id, payload, status, created_at, updated_at) VALUES (?, ?, 'queued', ?, ?)",
+                              (run['run_id'], json.dumps(run), now, now))
+    
+    def claim(self, worker: int = None):
+        """Atomically take the oldest queued job for process `worker` (default: this one): returns
+        (job id, run, attempt number) or None"""
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute("SELECT id, payload, attempts FROM jobs WHERE status = 'queued' "
+                                        "ORDER BY id LIMIT 1").fetchone()
+                if row:
+                    self.conn.execute("UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ?, "
+                                      "worker = ? WHERE id = ?", (time.time(), worker or os.getpid(), row[0]))
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return (row[0], json.loads(row[1]), row[2] + 1) if row else None
+    
+    def finish(self, job_id: int, error: str = None, requeue: bool = False) -> None:
+        """Mark a job done, failed (with `error`), or queued again to be resumed by the next claim"""
+        status = 'queued' if requeue else 'failed' if error else 'done'
+        with self._lock:
+            self.conn.execute("UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                              (status, error, time.time(), job_id))
+    
+    def requeue_running(self) -> int:
+        """Put jobs left 'running' by a crashed worker back in the queue (they resume from the journal)"""
+        with self._lock:
+            return self.conn.execute("UPDATE jobs SET status = 'queued', updated_at = ? WHERE status = 'running'",
+                                     (time.time(),)).rowcount
+    
+    def requeue_worker(self, worker: int) -> int:
+        """Requeue the jobs a dead worker process was running; those out of attempts are marked failed"""
+        with self._lock:
+            return self.conn.execute("UPDATE jobs SET status = CASE WHEN attempts < ? THEN 'queued' ELSE 'failed' END, "
+                                     "error = 'worker exited', updated_at = ? WHERE status = 'running' AND worker = ?",
+                                     (QUEUE_MAX_ATTEMPTS, time.time(), worker)).rowcount
+    
+    def depth(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+    
+    def counts(self) -> dict:
+        with self._lock:
+            rows = self.conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {'queued': 0, 'running': 0, 'done': 0, 'failed': 0, **dict(rows)}
+
+
+def queue_worker(queue_path: str = QUEUE_PATH, runs: int = INGEST_RUNS_PER_WORKER, rate_share: int = 1) -> None:
+    """Worker process: drain the job queue forever, running up to `runs` jobs concurrently.
+    
+    Concurrent runs in one process share the response cache and coalesce identical provider queries.
+    `rate_share` is the number of worker processes splitting the configured rate limits.
+    """
+    global rate_limiter
+    if rate_share > 1:
+        rate_limiter = RateLimitScheduler(RATE_LIMITS, rate_share)
+    queue = JobQueue(queue_path)
+    
+    def drain():
+        while True:
+            job = queue.claim()
+            if job is None:
+                time.sleep(QUEUE_POLL_INTERVAL)
+                continue
+            job_id, run, attempt = job
+            print(f"[worker {os.getpid()}] Starting {run['run_id']} (attempt {attempt})")
+            try:
+                result = run_pipeline(run, resume=attempt > 1)
+            except Exception as e:
+                requeue = attempt < QUEUE_MAX_ATTEMPTS
+                print(f"[worker {os.getpid()}] {run['run_id']} failed: {e}"
+                      f"{' - requeued to resume' if requeue else ''}")
+                queue.finish(job_id, error=repr(e), requeue=requeue)
+            else:
+                if result['failed_batches']:
+                    error = f"{len(result['failed_batches'])} Airtable batch(es) failed: {result['failed_batches']}"
+                    requeue = attempt < QUEUE_MAX_ATTEMPTS
+                    print(f"[worker {os.getpid()}] {run['run_id']}: {error}"
+                          f"{' - requeued to resume' if requeue else ''}")
+                    queue.finish(job_id, error=error, requeue=requeue)
+                else:
+                    queue.finish(job_id)
+            metrics.dump(METRICS_DIR)
+    
+    threads = [threading.Thread(target=drain, daemon=True) for _ in range(max(1, runs) - 1)]
+    for thread in threads:
+        thread.start()
+    drain()
+
+
+def validate_webhook_input(data) -> dict:
+    """Parse a webhook payload, raising ValueError when it cannot become a run"""
+    if not isinstance(data, dict):
+        raise ValueError("payload must be a JSON object")
+    try:
+        run = parse_webhook_input(data)
+    except (KeyError, TypeError, AttributeError) as e:
+        raise ValueError(f"malformed questions: {e!r}")
+    if not run['brand_name']:
+        raise ValueError("brand_name is required")
+    if not run['questions']:
+        raise ValueError("at least one question is required")
+    return run
+
+
+def make_ingest_handler(queue: JobQueue):
+    """HTTP handler: POST /webhook enqueues a run, GET /queue reports queue depth, GET /metrics is Prometheus text"""
+    from http.server import BaseHTTPRequestHandler
+    
+    class IngestHandler(BaseHTTPRequestHandler):
+        def _send(self, status: int, body: dict, headers: dict = None):
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+        
+        def do_GET(self):
+            if self.path == '/queue':
+                self._send(200, queue.counts())
+            elif self.path == '/healthz':
+                self._send(200, {'ok': True})
+            elif self.path == '/metrics':
+                lines = ["# TYPE tracker_queue_jobs gauge"]
+                lines += [f'tracker_queue_jobs{{status="{status}"}} {n}' for status, n in queue.counts().items()]
+                data = (merged_prometheus(METRICS_DIR) + '\n'.join(lines) + '\n').encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            else:
+                self._send(404, {'error': 'not found'})
+        
+        def do_POST(self):
+            if self.path != '/webhook':
+                self._send(404, {'error': 'not found'})
+                return
+            
+            # Backpressure: refuse new runs while the backlog is full
+            depth = queue.depth()
+            if depth >= QUEUE_MAX_DEPTH:
+                self._send(503, {'error': 'queue full', 'queue_depth': depth}, {'Retry-After': '30'})
+                return
+            
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                run = validate_webhook_input(json.loads(self.rfile.read(length) or b'null'))
+            except ValueError as e:
+                self._send(400, {'error': str(e)})
+                return
+            
+            queue.enqueue(run)
+            self._send(202, {'run_id': run['run_id'], 'customer_id': run['customer_id'], 'queue_depth': depth + 1})
+        
+        def log_message(self, format, *args):
+            pass
+    
+    return IngestHandler
+
+
+def serve(host: str = INGEST_HOST, port: int = INGEST_PORT, workers: int = INGEST_WORKERS) -> None:
+    """Run the webhook ingestion server with a pool of worker processes"""
+    import multiprocessing
+    from http.server import ThreadingHTTPServer
+    
+    queue = JobQueue(QUEUE_PATH)
+    requeued = queue.requeue_running()
+    if requeued:
+        print(f"Requeued {requeued} interrupted runs")
+    
+    # Worker metrics snapshots from an earlier server are stale; counters restart with the workers
+    if os.path.isdir(METRICS_DIR):
+        for name in os.listdir(METRICS_DIR):
+            os.remove(os.path.join(METRICS_DIR, name))
+    
+    ctx = multiprocessing.get_context('spawn')
+    # Every worker has its own rate limiter, so each gets an equal share of the provider quotas
+    workers = max(1, workers)
+    
+    def start_worker():
+        proc = ctx.Process(target=queue_worker, args=(QUEUE_PATH, INGEST_RUNS_PER_WORKER, workers), daemon=True)
+        proc.start()
+        return proc
+    
+    processes = [start_worker() for _ in range(workers)]
+    
+    server = ThreadingHTTPServer((host, port), make_ingest_handler(queue))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Listening on http://{host}:{port} with {len(processes)} workers")
+    try:
+        # Supervise: a worker that died (OOM kill, segfault, unhandled error) is replaced and the
+        # jobs it had claimed go back in the queue instead of staying 'running' forever
+        while True:
+            time.sleep(QUEUE_SUPERVISE_INTERVAL)
+            for i, proc in enumerate(processes):
+                if proc.is_alive():
+                    continue
+                requeued = queue.requeue_worker(proc.pid)
+                print(f"Worker {proc.pid} exited with code {proc.exitcode}; requeued {requeued} runs, restarting")
+                metrics.inc('tracker_worker_restarts_total')
+                metrics.dump(METRICS_DIR)
+                processes[i] = start_worker()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.server_close()
+        for proc in processes:
+            proc.terminate()
+
+
 # Test with sample data
 if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == 'serve':
+        serve()
+        sys.exit(0)
+    
+    if len(sys.argv) == 3 and sys.argv[1] == 'resume':
+        outcome = resume_run(sys.argv[2])
+        print(f"Resumed {outcome['run_id']}: saved {outcome['saved_records']} records, "
+              f"{len(outcome['failed_batches'])} Airtable batch(es) failed, "
+              f"dashboard record {outcome['dashboard_record'].get('id', 'Error')}")
+        sys.exit(1 if outcome['failed_batches'] else 0)
+    
     sample_input = {
         'session_id': 'SES_1769121224684_EJJB',
         'brand_name': 'Suzy',
@@ -797,16 +3621,18 @@ if __name__ == "__main__":
         key_messages=result['key_messages'],
         competitors=result['competitors'],
         run_id=result['run_id'],
-        customer_id=result['customer_id']
+        customer_id=result['customer_id'],
+        brand_variations=industry_data.get('brand_variations', []),
+        valid_competitors=industry_data.get('valid_competitors', [])
     )
     
     print("\nResults:")
     for r in tracker_results:
-        print(f"  Question: {r['question_text'][:50]}...")
-        print(f"  ChatGPT overall: {r['analysis']['chatgpt']['overall']}")
-        print(f"  Claude overall: {r['analysis']['claude']['overall']}")
-        print(f"  Gemini overall: {r['analysis']['gemini']['overall']}")
-        print(f"  Perplexity overall: {r['analysis']['perplexity']['overall']}")
+        print(f"  Question: {r.question_text[:50]}...")
+        print(f"  ChatGPT overall: {r.score('chatgpt').overall}")
+        print(f"  Claude overall: {r.score('claude').overall}")
+        print(f"  Gemini overall: {r.score('gemini').overall}")
+        print(f"  Perplexity overall: {r.score('perplexity').overall}")
     
     # Steps 22-24: Save to Airtable
     print("\nSteps 22-24: Saving to Airtable...")
@@ -819,7 +3645,8 @@ if __name__ == "__main__":
         results=tracker_results,
         brand_name=result['brand_name'],
         valid_competitors=industry_data.get('valid_competitors', []),
-        industry=industry_data.get('industry', '')
+        industry=industry_data.get('industry', ''),
+        brand_variations=industry_data.get('brand_variations', [])
     )
     print(f"  Visibility Score: {analysis['visibility_score']}")
     print(f"  Brand Coverage: {analysis['brand_coverage']}%")
@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+"""
+Offline throughput benchmark for the full tracker pipeline (parse_webhook_input -> save_dashboard_output).
+
+Every external API (OpenAI, Anthropic, Gemini, Perplexity, Brand.dev, Airtable) is replaced by a local
+stand-in server, so a run costs nothing. Stand-ins have configurable latency (log-normal around a median),
+error and 429 rates, and response sizes. Each question count runs in a fresh process so peak RSS is per run.
+
+Usage:
+  python scripts/benchmark_pipeline.py                           # 10, 100 and 1000 questions
+  python scripts/benchmark_pipeline.py --sizes 10,50 --latency-scale 0.1
+  python scripts/benchmark_pipeline.py --rate-429 0.05 --error-rate 0.01
+  python scripts/benchmark_pipeline.py --profile profile.json    # per-service overrides, see DEFAULT_PROFILE
+  python scripts/benchmark_pipeline.py --json baseline.json      # save results
+  python scripts/benchmark_pipeline.py --baseline baseline.json  # compare against saved results
+  SAMPLING_ENABLED=1 python scripts/benchmark_pipeline.py --sizes 10 --mention-rate 0.95  # multi-sample
+
+Provider rate limits are lifted by default so the pipeline itself is measured; pass --keep-rate-limits to
+run under the configured RPM/TPM budgets.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Anthropic's minimum cacheable prompt prefix (tokens) for Sonnet models
+CACHE_MIN_TOKENS = 1024
+
+# Per-service stand-in behaviour: median latency (ms), log-normal spread, failure rates, reply size (chars)
+DEFAULT_PROFILE = {
+    'openai': {'latency_ms': 2500, 'latency_sigma': 0.5, 'error_rate': 0.0, 'rate_429': 0.0, 'response_chars': 3000},
+    'anthropic': {'latency_ms': 3000, 'latency_sigma': 0.5, 'error_rate': 0.0, 'rate_429': 0.0, 'response_chars': 3000},
+    'gemini': {'latency_ms': 2000, 'latency_sigma': 0.6, 'error_rate': 0.0, 'rate_429': 0.0, 'response_chars': 3500},
+    'perplexity': {'latency_ms': 4000, 'latency_sigma': 0.7, 'error_rate': 0.0, 'rate_429': 0.0, 'response_chars': 2500},
+    'brand': {'latency_ms': 600, 'latency_sigma': 0.3, 'error_rate': 0.0, 'rate_429': 0.0, 'response_chars': 0},
+    'airtable': {'latency_ms': 250, 'latency_sigma': 0.3, 'error_rate': 0.0, 'rate_429': 0.0, 'response_chars': 0},
+}
+SERVICES = list(DEFAULT_PROFILE)
+
+BRAND = 'Acme Insights'
+COMPETITORS = ['Qualtrics', 'SurveyMonkey', 'Medallia']
+FILLER = ('the platform offers teams survey tooling analytics research panels dashboards integrations pricing '
+          'support quality speed coverage reporting customers enterprise market insight workflow').split()
+
+
+class StandIn:
+    """Shared state of the stand-in server: profile, seeded RNG and per-service call counters"""
+
+    def __init__(self, profile: dict, mention_rate: float, retry_after: float, seed: int):
+        self.profile = profile
+        self.mention_rate = mention_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counts = {s: {'calls': 0, '429': 0, 'errors': 0} for s in SERVICES}
+            self.cached_prefixes = set()
+
+    def roll(self, service: str):
+        """Pick this call's latency and outcome ('ok', '429' or 'error') and count it"""
+        conf = self.profile[service]
+        with self.lock:
+            latency = self.random.lognormvariate(math.log(max(conf['latency_ms'], 0.001) / 1000), conf['latency_sigma'])
+            draw = self.random.random()
+            outcome = '429' if draw < conf['rate_429'] else 'error' if draw < conf['rate_429'] + conf['error_rate'] else 'ok'
+            self.counts[service]['calls'] += 1
+            if outcome != 'ok':
+                self.counts[service]['429' if outcome == '429' else 'errors'] += 1
+            mention = self.random.random() < self.mention_rate
+        return latency, outcome, mention
+
+    def answer_text(self, service: str, mention: bool) -> str:
+        """Plain-prose reply of the configured size, naming the brand (and a competitor) when `mention`"""
+        size = self.profile[service]['response_chars']
+        with self.lock:
+            words = [self.random.choice(FILLER) for _ in range(max(1, size // 7))]
+            competitor = self.random.choice(COMPETITORS)
+        lead = f"{BRAND} and {competitor} are both worth a look. " if mention else f"{competitor} is a common choice. "
+        return (lead + ' '.join(words))[:max(size, len(lead))]
+
+
+def analysis_reply(prompt: str) -> str:
+    """Anthropic stand-in for analysis and industry prompts: echo the JSON template the prompt asks for"""
+    if 'Return this exact JSON structure' in prompt:
+        return json.dumps({
+            'industry': 'consumer insights software',
+            'industry_keywords': ['market research', 'surveys', 'consumer insights'],
+            'valid_competitors': COMPETITORS,
+            'brand_variations': [BRAND, BRAND.split()[0]],
+            'invalid_inputs': [],
+            'disambiguation_term': 'market research platform'
+        })
+    return prompt[prompt.rfind('Return ONLY valid JSON'):].split('\n', 1)[1]
+
+
+def make_handler(state: StandIn):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def reply(self, code: int, body, headers: dict = None):
+            data = json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def handle_any(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            body = json.loads(self.rfile.read(length) or b'{}')
+            path = urlsplit(self.path).path
+            service = path.strip('/').split('/')[0]
+
+            if path == '/__stats':
+                with state.lock:
+                    return self.reply(200, state.counts)
+            if path == '/__reset':
+                state.reset()
+                return self.reply(200, {})
+            if service not in SERVICES:
+                return self.reply(404, {'error': 'unknown service'})
+
+            latency, outcome, mention = state.roll(service)
+            time.sleep(latency)
+            if outcome == '429':
+                return self.reply(429, {'error': 'rate limited'}, {
+                    'retry-after': str(state.retry_after), 'retry-after-ms': str(int(state.retry_after * 1000))})
+            if outcome == 'error':
+                return self.reply(500, {'error': 'stand-in failure'})
+
+            prompt_tokens = len(json.dumps(body)) // 4
+            if service in ('openai', 'perplexity'):
+                text = state.answer_text(service, mention)
+                return self.reply(200, {'choices': [{'message': {'role': 'assistant', 'content': text}}],
+                                        'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': len(text) // 4}})
+            if service == 'gemini':
+                text = state.answer_text(service, mention)
+                return self.reply(200, {'candidates': [{'content': {'parts': [{'text': text}]}}],
+                                        'usageMetadata': {'promptTokenCount': prompt_tokens,
+                                                          'candidatesTokenCount': len(text) // 4}})
+            if service == 'anthropic':
+                prompt = body['messages'][0]['content']
+                if isinstance(prompt, list):
+                    prompt = ''.join(block.get('text', '') for block in prompt)
+                text = analysis_reply(prompt) if 'JSON' in prompt else state.answer_text(service, mention)
+                usage = {'input_tokens': len(prompt) // 4, 'output_tokens': len(text) // 4}
+                # Prompt caching: the first request with a cached system prefix writes it, later ones read it.
+                # Like the API, prefixes under the minimum cacheable length are billed as plain input.
+                system = body.get('system')
+                prefix = ''.join(block.get('text', '') for block in system) if isinstance(system, list) else ''
+                cacheable = isinstance(system, list) and any('cache_control' in block for block in system)
+                if cacheable and len(prefix) // 4 >= CACHE_MIN_TOKENS:
+                    with state.lock:
+                        seen = prefix in state.cached_prefixes
+                        state.cached_prefixes.add(prefix)
+                    usage['cache_read_input_tokens' if seen else 'cache_creation_input_tokens'] = len(prefix) // 4
+                elif system:
+                    usage['input_tokens'] += len(prefix or str(system)) // 4
+                return self.reply(200, {
+                    'id': 'msg_standin', 'type': 'message', 'role': 'assistant', 'model': body.get('model', ''),
+                    'content': [{'type': 'text', 'text': text}], 'stop_reason': 'end_turn', 'stop_sequence': None,
+                    'usage': usage})
+            if service == 'brand':
+                return self.reply(200, {'status': 'ok', 'brand': {
+                    'title': BRAND, 'colors': [{'hex': '#123456'}],
+                    'logos': [{'type': 'logo', 'url': 'https://example.com/logo.png'}]}})
+            # Airtable: echo the records back with ids
+            records = body.get('records', [])
+            return self.reply(200, {'records': [
+                {'id': f"rec{random.getrandbits(40):010x}", 'fields': r.get('fields', {})} for r in records]})
+
+        do_GET = do_POST = do_PATCH = handle_any
+
+    return Handler
+
+
+def serve_stand_ins(port: int, profile: dict, mention_rate: float, retry_after: float, seed: int):
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(StandIn(profile, mention_rate, retry_after, seed)))
+    server.daemon_threads = True
+    server.request_queue_size = 1024
+    server.serve_forever()
+
+
+def control(port: int, path: str) -> dict:
+    import urllib.request
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", data=b'{}' if path == '/__reset' else None) as r:
+        return json.loads(r.read())
+
+
+def percentile(values: list, pct: float) -> float:
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)] if ordered else 0.0
+
+
+def benchmark_env(port: int, workdir: str, keep_rate_limits: bool) -> dict:
+    base = f"http://127.0.0.1:{port}"
+    env = {
+        'OPENAI_API_BASE': f"{base}/openai/v1",
+        'ANTHROPIC_BASE_URL': f"{base}/anthropic",
+        'GEMINI_API_BASE': f"{base}/gemini/v1beta",
+        'PERPLEXITY_API_BASE': f"{base}/perplexity",
+        'BRAND_DEV_API_BASE': f"{base}/brand/v1",
+        'AIRTABLE_API_BASE': f"{base}/airtable/v0",
+        'OPENAI_API_KEY': 'bench', 'ANTHROPIC_API_KEY': 'bench', 'GEMINI_API_KEY': 'bench',
+        'PERPLEXITY_API_KEY': 'bench', 'BRAND_DEV_API_KEY': 'bench', 'AIRTABLE_API_KEY': 'bench',
+        'ANALYSIS_OFFLINE': 'false',
+        'RESPONSE_CACHE_ENABLED': 'false',
+        'TRACKER_CACHE_PATH': os.path.join(workdir, 'cache.sqlite3'),
+        'RUN_JOURNAL_DIR': os.path.join(workdir, 'journals'),
+        'BLOB_STORE_DIR': os.path.join(workdir, 'blobs'),
+        'METRICS_LOG_PATH': os.path.join(workdir, 'metrics.jsonl'),
+        'TRACKER_HISTORY_PATH': os.path.join(workdir, 'history.sqlite3'),
+        'RETRY_BASE_DELAY': '0.1',
+    }
+    if not keep_rate_limits:
+        for provider in ('CHATGPT', 'CLAUDE', 'GEMINI', 'PERPLEXITY', 'AIRTABLE'):
+            env[f"{provider}_RPM"] = '0'
+            env[f"{provider}_TPM"] = '0'
+    return env
+
+
+def run_size(count: int, env: dict, results):
+    """Child process: run the pipeline once on `count` questions and report timings"""
+    os.environ.update(env)
+    sys.path.insert(0, ROOT)
+    import main
+
+    started = {}
+    finished = {}
+    iter_tracker_results = main.iter_tracker_results
+
+    def timed(query):
+        def timed_query(question, *args, **kwargs):
+            started.setdefault(question, time.perf_counter())
+            return query(question, *args, **kwargs)
+        return timed_query
+
+    def timed_results(*args, **kwargs):
+        for result in iter_tracker_results(*args, **kwargs):
+            finished[result.question_text] = time.perf_counter()
+            yield result
+
+    main.query_all_providers = timed(main.query_all_providers)
+    main.sample_all_providers = timed(main.sample_all_providers)
+    main.iter_tracker_results = timed_results
+
+    payload = {
+        'session_id': f"BENCH_{count}",
+        'brand_name': BRAND,
+        'website': 'acme-insights.example',
+        'key_messages': ['fastest consumer insights', 'trusted by enterprise teams'],
+        'competitors': COMPETITORS,
+        'question_count': count,
+        'questions': {str(i): {'Questions Text': f"Benchmark question {i}: which insights platform is best?",
+                               'Questions Category': 'Benchmark'} for i in range(1, count + 1)}
+    }
+
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        out = main.run_pipeline(main.parse_webhook_input(payload))
+    elapsed = time.perf_counter() - t0
+
+    latencies = [finished[q] - started[q] for q in finished if q in started]
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put({
+        'questions': count,
+        'seconds': round(elapsed, 3),
+        'questions_per_second': round(count / elapsed, 3),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+        'peak_rss_mb': round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1),
+        'saved_records': out['saved_records'],
+        'retries': dict(main.rate_limiter.retries),
+        'estimated_cost_usd': out['metrics']['cost_usd'],
+        'prompt_cache_read_tokens': sum(out['metrics']['cache_read_tokens'].values()),
+        'trimmed_tokens': out['metrics']['trimmed_tokens'],
+        'samples': out['metrics']['samples'],
+        'samples_saved': out['metrics']['samples_saved'],
+        'stage_seconds': out['metrics']['stages'],
+    })
+
+
+def wait_for_result(child, results) -> dict:
+    import queue
+    while True:
+        try:
+            row = results.get(timeout=1)
+        except queue.Empty:
+            if not child.is_alive():
+                raise RuntimeError(f"benchmark run exited with code {child.exitcode} before reporting")
+            continue
+        child.join()
+        return row
+
+
+def load_profile(args) -> dict:
+    profile = {s: dict(conf) for s, conf in DEFAULT_PROFILE.items()}
+    if args.profile:
+        with open(args.profile) as f:
+            for service, overrides in json.load(f).items():
+                profile[service].update(overrides)
+    for conf in profile.values():
+        conf['latency_ms'] *= args.latency_scale
+        if args.error_rate is not None:
+            conf['error_rate'] = args.error_rate
+        if args.rate_429 is not None:
+            conf['rate_429'] = args.rate_429
+        if args.response_chars is not None and conf['response_chars']:
+            conf['response_chars'] = args.response_chars
+    return profile
+
+
+def print_report(rows: list, baseline: list = None):
+    header = (f"{'questions':>9} {'seconds':>9} {'q/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'RSS MB':>8} "
+              f"{'cost $':>8}  calls")
+    print(header)
+    print('-' * len(header))
+    for row in rows:
+        calls = ' '.join(f"{s}={c['calls']}" + (f"({c['429']}x429,{c['errors']}x5xx)" if c['429'] or c['errors'] else '')
+                         for s, c in row['calls'].items() if c['calls'])
+        print(f"{row['questions']:>9} {row['seconds']:>9.2f} {row['questions_per_second']:>8.2f} {row['p50_ms']:>9.0f} "
+              f"{row['p95_ms']:>9.0f} {row['p99_ms']:>9.0f} {row['peak_rss_mb']:>8.1f} {row['estimated_cost_usd']:>8.3f}  {calls}")
+
+    if baseline:
+        previous = {row['questions']: row for row in baseline}
+        print("\nAgainst baseline:")
+        for row in rows:
+            old = previous.get(row['questions'])
+            if not old:
+                continue
+            def delta(key):
+                return f"{(row[key] - old[key]) / old[key] * 100:+.1f}%" if old[key] else 'n/a'
+            print(f"  {row['questions']:>5} questions: q/s {delta('questions_per_second')}, p95 {delta('p95_ms')}, "
+                  f"RSS {delta('peak_rss_mb')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='10,100,1000', help="comma-separated question counts")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--profile', help="JSON file of per-service overrides to DEFAULT_PROFILE")
+    parser.add_argument('--latency-scale', type=float, default=1.0, help="multiply every median latency")
+    parser.add_argument('--error-rate', type=float, help="5xx rate for every service")
+    parser.add_argument('--rate-429', type=float, help="429 rate for every service")
+    parser.add_argument('--response-chars', type=int, help="reply size for every LLM stand-in")
+    parser.add_argument('--retry-after', type=float, default=0.5, help="Retry-After seconds sent with 429s")
+    parser.add_argument('--mention-rate', type=float, default=0.6, help="share of replies naming the brand")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--keep-rate-limits', action='store_true')
+    parser.add_argument('--json', help="write results to this file")
+    parser.add_argument('--baseline', help="compare against results saved with --json")
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context('spawn')
+    server = ctx.Process(target=serve_stand_ins, daemon=True,
+                         args=(args.port, load_profile(args), args.mention_rate, args.retry_after, args.seed))
+    server.start()
+    for _ in range(100):
+        try:
+            control(args.port, '/__reset')
+            break
+        except OSError:
+            time.sleep(0.05)
+
+    rows = []
+    try:
+        for count in [int(n) for n in args.sizes.split(',') if n.strip()]:
+            control(args.port, '/__reset')
+            results = ctx.Queue()
+            with tempfile.TemporaryDirectory() as workdir:
+                child = ctx.Process(target=run_size, args=(count, benchmark_env(args.port, workdir, args.keep_rate_limits), results))
+                child.start()
+                row = wait_for_result(child, results)
+            row['calls'] = control(args.port, '/__stats')
+            rows.append(row)
+            print(f"{count} questions: {row['questions_per_second']:.2f} q/s", file=sys.stderr)
+    finally:
+        server.terminate()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+    print_report(rows, baseline)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'results': rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark: time from interpreter start to a worker ready to take a webhook.
+
+Each sample is a fresh `python` process that imports main, parses a sample webhook payload and, with
+--first-call, builds the Claude client (the cost lazy construction moves off the startup path). Reports
+min/median/p95 per phase and which heavy modules were already imported by the time the worker was ready.
+
+Usage:
+  python scripts/benchmark_startup.py                            # 20 cold starts
+  python scripts/benchmark_startup.py --runs 50 --first-call
+  python scripts/benchmark_startup.py --importtime 15            # slowest modules from -X importtime
+  python scripts/benchmark_startup.py --json startup.json        # save results
+  python scripts/benchmark_startup.py --baseline startup.json    # compare against saved results
+"""
+
+import argparse
+import json
+import math
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules whose import dominates startup when loaded eagerly
+HEAVY_MODULES = ('anthropic', 'httpx', 'pydantic', 'requests', 'urllib3', 'numpy')
+
+# Run in the child: the interpreter's own startup is excluded, everything main does at import is included
+CHILD = r"""
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {root!r})
+import main
+imported = time.perf_counter()
+run = main.parse_webhook_input({{
+    'session_id': 'SES_STARTUP', 'brand_name': 'Acme', 'website': 'acme.example',
+    'key_messages': ['fastest consumer insights'], 'competitors': ['Globex', 'Initech'],
+    'question_count': 2,
+    'questions': {{'1': {{'Questions Text': 'Which insights platform is best?', 'Questions Category': 'Awareness'}},
+                   '2': {{'Questions Text': 'How do teams run market research?', 'Questions Category': 'Awareness'}}}},
+}})
+ready = time.perf_counter()
+assert len(run['questions']) == 2, run
+loaded = [m for m in {heavy!r} if m in sys.modules]
+first_call = None
+if {first_call!r}:
+    main.get_claude_client()
+    first_call = (time.perf_counter() - ready) * 1000
+print(json.dumps({{
+    'import_ms': (imported - start) * 1000,
+    'ready_ms': (ready - start) * 1000,
+    'first_call_ms': first_call,
+    'loaded': loaded,
+}}))
+"""
+
+
+def percentile(values: list, pct: float) -> float:
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)] if ordered else 0.0
+
+
+def startup_env(workdir: str) -> dict:
+    """Keep caches, journals and metrics out of the working tree and make sure nothing reaches a real API"""
+    env = dict(os.environ)
+    env.update({
+        'ANTHROPIC_API_KEY': env.get('ANTHROPIC_API_KEY') or 'bench',
+        'ANTHROPIC_BASE_URL': 'http://127.0.0.1:9',
+        'TRACKER_CACHE_PATH': os.path.join(workdir, 'cache.sqlite3'),
+        'RUN_JOURNAL_DIR': os.path.join(workdir, 'journals'),
+        'BLOB_STORE_DIR': os.path.join(workdir, 'blobs'),
+        'METRICS_LOG_PATH': os.path.join(workdir, 'metrics.jsonl'),
+        'TRACKER_HISTORY_PATH': os.path.join(workdir, 'history.sqlite3'),
+    })
+    return env
+
+
+def cold_start(env: dict, first_call: bool) -> dict:
+    code = CHILD.format(root=ROOT, first_call=first_call, heavy=HEAVY_MODULES)
+    out = subprocess.run([sys.executable, '-c', code], env=env, cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def import_offenders(env: dict, top: int) -> list:
+    """Slowest modules by cumulative import time (microseconds), from -X importtime"""
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'],
+                         env=env, cwd=ROOT, capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        parts = line.split('|')
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        rows.append((int(parts[1]), parts[2].strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def summarize(samples: list) -> dict:
+    result = {}
+    for phase in ('import_ms', 'ready_ms', 'first_call_ms'):
+        values = [s[phase] for s in samples if s[phase] is not None]
+        if values:
+            result[phase] = {'min': min(values), 'median': statistics.median(values), 'p95': percentile(values, 95)}
+    result['loaded'] = sorted({m for s in samples for m in s['loaded']})
+    return result
+
+
+def print_report(result: dict, baseline: dict = None):
+    print(f"{'phase':<16}{'min':>10}{'median':>10}{'p95':>10}{'vs baseline':>14}")
+    for phase in ('import_ms', 'ready_ms', 'first_call_ms'):
+        row = result.get(phase)
+        if not row:
+            continue
+        delta = ''
+        if baseline and baseline.get(phase):
+            delta = f"{row['median'] / baseline[phase]['median']:.2f}x"
+        print(f"{phase:<16}{row['min']:>10.1f}{row['median']:>10.1f}{row['p95']:>10.1f}{delta:>14}")
+    print(f"heavy modules loaded: {', '.join(result['loaded']) or 'none'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=20, help="number of cold starts")
+    parser.add_argument('--first-call', action='store_true', help="also time building the Claude client")
+    parser.add_argument('--importtime', type=int, default=0, metavar='N', help="list the N slowest imports")
+    parser.add_argument('--json', help="write results to this file")
+    parser.add_argument('--baseline', help="compare against results saved with --json")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        env = startup_env(workdir)
+        cold_start(env, args.first_call)  # warm the OS page cache and .pyc files, not measured
+        samples = [cold_start(env, args.first_call) for _ in range(args.runs)]
+        offenders = import_offenders(env, args.importtime) if args.importtime else []
+
+    result = summarize(samples)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+    print_report(result, baseline)
+    if offenders:
+        print(f"\n{'cumulative ms':>14}  module")
+        for micros, module in offenders:
+            print(f"{micros / 1000:>14.1f}  {module}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'results': result}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
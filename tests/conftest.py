@@ -0,0 +1,25 @@
+"""Test environment for main.py: offline analysis, no real API endpoints, caches in a temp dir.
+
+The environment is set before main is imported, since main reads its configuration at import time.
+"""
+
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKDIR = tempfile.mkdtemp(prefix='tracker-tests-')
+
+os.environ.update({
+    'ANALYSIS_OFFLINE': '1',
+    'ANTHROPIC_API_KEY': 'test',
+    'ANTHROPIC_BASE_URL': 'http://127.0.0.1:9',
+    'TRACKER_CACHE_PATH': os.path.join(WORKDIR, 'cache.sqlite3'),
+    'RUN_JOURNAL_DIR': os.path.join(WORKDIR, 'journals'),
+    'BLOB_STORE_DIR': os.path.join(WORKDIR, 'blobs'),
+    'TRACKER_HISTORY_PATH': os.path.join(WORKDIR, 'history.sqlite3'),
+    'QUEUE_PATH': os.path.join(WORKDIR, 'queue.sqlite3'),
+    'METRICS_LOG_PATH': '',
+    'METRICS_DIR': os.path.join(WORKDIR, 'metrics'),
+})
+sys.path.insert(0, ROOT)
@@ -0,0 +1,65 @@
+import threading
+
+import pytest
+import requests
+
+import main
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None, text=''):
+        self.status_code = status_code
+        self._body = body or {}
+        self.text = text
+    
+    def json(self):
+        return self._body
+
+
+@pytest.fixture
+def airtable(monkeypatch):
+    sent = []
+    rejected, dropped = set(), set()
+    lock = threading.Lock()
+    
+    def send(service, method, url, headers=None, json=None, **kwargs):
+        with lock:
+            sent.append((method, url, json))
+        first = json['records'][0]['fields']['n']
+        if first in dropped:
+            raise requests.ConnectionError('connection reset')
+        if first in rejected:
+            return FakeResponse(422, text='INVALID_VALUE')
+        return FakeResponse(200, {'records': [{'id': f"rec{r['fields']['n']}"} for r in json['records']]})
+    
+    monkeypatch.setattr(main, 'send_with_retry', send)
+    return sent, rejected, dropped
+
+
+def test_records_are_sent_in_batches_of_ten(airtable):
+    sent, _, _ = airtable
+    report = main.write_airtable_records('Raw Question Data', [{'n': i} for i in range(23)])
+    
+    assert sorted(len(payload['records']) for _, _, payload in sent) == [3, 10, 10]
+    assert all(method == 'POST' and url.endswith('/Raw%20Question%20Data') for method, url, _ in sent)
+    assert (report['succeeded'], report['failed']) == (3, 0)
+    assert [r['id'] for r in report['records']] == [f"rec{i}" for i in range(23)]
+
+
+def test_merge_on_upserts_with_patch(airtable):
+    sent, _, _ = airtable
+    main.write_airtable_records('Raw Question Data', [{'n': 0}], merge_on=['run_id', 'question_number'])
+    method, _, payload = sent[0]
+    assert method == 'PATCH'
+    assert payload['performUpsert'] == {'fieldsToMergeOn': ['run_id', 'question_number']}
+
+
+def test_failed_batches_are_reported_with_their_labels(airtable):
+    _, rejected, dropped = airtable
+    rejected.add(10)
+    dropped.add(20)
+    report = main.write_airtable_records('T', [{'n': i} for i in range(25)], labels=[1, 11, 21])
+    
+    failed = [(b['label'], b['status'], b['error']) for b in report['batches'] if not b['ok']]
+    assert failed == [(11, 422, 'INVALID_VALUE'), (21, None, 'connection reset')]
+    assert (report['succeeded'], report['failed'], len(report['records'])) == (1, 2, 10)
@@ -0,0 +1,48 @@
+import main
+
+BLOCK = '{"mention":100,"position":75,"sentiment":80,"recommendation":50,"message_alignment":40,"overall":70,"competitors_mentioned":"Zappi","notes":"ok"}'
+
+
+def test_repair_json_strips_fences_and_prose():
+    raw = f'Here is the analysis:\n```json\n{{"chatgpt": {BLOCK}}}\n```\nLet me know!'
+    assert main.extract_json(raw)['chatgpt']['overall'] == 70
+
+
+def test_repair_json_python_literals_and_trailing_commas():
+    raw = '{"x": 1, "flag": True, "missing": None,}'
+    assert main.extract_json(raw) == {'x': 1, 'flag': True, 'missing': None}
+
+
+def test_repair_json_closes_truncated_output():
+    raw = f'{{"chatgpt": {BLOCK}, "claude": {{"mention": 100, "posi'
+    repaired = main.extract_json(raw)
+    assert repaired['chatgpt']['mention'] == 100
+    assert 'claude' in repaired
+
+
+def test_parse_platform_scores_single_question():
+    blocks = main.parse_platform_scores(f'{{"chatgpt": {BLOCK}, "gemini": {BLOCK}}}')
+    assert set(blocks) == {(None, 'chatgpt'), (None, 'gemini')}
+    assert blocks[(None, 'gemini')]['competitors_mentioned'] == 'Zappi'
+
+
+def test_parse_platform_scores_keeps_valid_blocks_next_to_a_bad_one():
+    bad = '{"mention": "lots", "position": 0}'
+    blocks = main.parse_platform_scores(f'{{"chatgpt": {BLOCK}, "claude": {bad}, "gemini": {BLOCK}}}')
+    assert set(blocks) == {(None, 'chatgpt'), (None, 'gemini')}
+
+
+def test_parse_platform_scores_batch_salvages_truncated_reply():
+    raw = f'{{"1": {{"chatgpt": {BLOCK}}}, "2": {{"claude": {BLOCK}, "gemini": {{"mention": 10'
+    blocks = main.parse_platform_scores(raw)
+    assert ('1', 'chatgpt') in blocks
+    assert ('2', 'claude') in blocks
+    assert ('2', 'gemini') not in blocks
+
+
+def test_coerce_platform_score_accepts_numeric_strings():
+    block = main.coerce_platform_score({**{f: '80%' for f in main.SCORE_FIELDS}, 'competitors_mentioned': ['A', 'B']})
+    assert block['overall'] == 80.0
+    assert block['competitors_mentioned'] == 'A, B'
+    assert main.coerce_platform_score({'mention': True}) is None
+
@@ -0,0 +1,33 @@
+import main
+
+
+def responses(text: str) -> dict:
+    return {p: f"{text} on {p}" for p in main.PLATFORMS}
+
+
+def test_offline_analysis_scores_every_platform_empty():
+    analysis = main.analyze_responses('Acme', [], [], 'Best tool?', responses('Acme is a good choice'))
+    assert set(analysis) == set(main.PLATFORMS)
+    assert all(analysis[p]['overall'] == 0 for p in main.PLATFORMS)
+
+
+def test_batch_returns_one_analysis_per_question_in_order(monkeypatch):
+    prompts = []
+    offline = main.analysis_complete
+    monkeypatch.setattr(main, 'analysis_complete', lambda p, m, *rest: prompts.append(p) or offline(p, m, *rest))
+    items = [(f"Question {i}?", responses(f"Acme answer {i}")) for i in range(3)]
+    analyses = main.analyze_responses_batch('Acme', [], [], items)
+    assert len(analyses) == 3
+    assert all(set(a) == set(main.PLATFORMS) for a in analyses)
+    assert len(prompts) == 1
+    assert all(f"Question {i}?" in prompts[0] for i in range(3))
+
+
+def test_batch_skips_the_call_when_nothing_needs_judgement(monkeypatch):
+    def unexpected(*args):
+        raise AssertionError("analysis call made")
+    
+    monkeypatch.setattr(main, 'analysis_complete', unexpected)
+    prescorer = main.LocalPrescorer('Acme')
+    analyses = main.analyze_responses_batch('Acme', [], [], [('Q?', responses('Nobody relevant'))], prescorer)
+    assert all(a['notes'].startswith('Brand not mentioned') for a in analyses[0].values())
@@ -0,0 +1,64 @@
+import os
+import time
+
+import main
+
+
+def age(store, ref, seconds):
+    path = store._find(ref.split(':', 1)[-1])
+    old = time.time() - seconds
+    os.utime(path, (old, old))
+    return path
+
+
+def test_put_deduplicates_and_round_trips(tmp_path):
+    store = main.BlobStore(str(tmp_path))
+    ref = store.put('hello')
+    assert store.put('hello') == ref
+    assert store.get(ref) == 'hello'
+
+
+def test_sweep_expires_blobs_past_ttl(tmp_path):
+    store = main.BlobStore(str(tmp_path))
+    stale, fresh = store.put('stale'), store.put('fresh')
+    age(store, stale, 7200)
+    
+    report = main.BlobStore(str(tmp_path)).sweep(max_age=3600)
+    assert report['removed'] == 1
+    assert store.get(fresh) == 'fresh'
+    assert store._find(stale.split(':', 1)[-1]) is None
+
+
+def test_sweep_evicts_oldest_until_under_size_bound(tmp_path):
+    store = main.BlobStore(str(tmp_path))
+    refs = [store.put(f"response {i}" * 50) for i in range(3)]
+    for i, ref in enumerate(refs):
+        age(store, ref, 300 - i * 100)
+    newest = os.path.getsize(store._find(refs[-1].split(':', 1)[-1]))
+    
+    report = store.sweep(max_bytes=newest)
+    assert report['removed'] == 2
+    assert report['remaining_bytes'] == newest
+    assert store.get(refs[-1]).startswith('response 2')
+
+
+def test_sweep_keeps_live_and_recently_written_blobs(tmp_path):
+    store = main.BlobStore(str(tmp_path))
+    live, rewritten = store.put('live'), store.put('rewritten')
+    age(store, live, 7200)
+    future = time.time() + 60  # put() again while the sweep runs
+    os.utime(age(store, rewritten, 7200), (future, future))
+    
+    report = store.sweep(max_age=3600, max_bytes=1, keep={live.split(':', 1)[-1]})
+    assert report['removed'] == 0
+    assert store.get(live) == 'live' and store.get(rewritten) == 'rewritten'
+
+
+def test_response_text_is_empty_once_the_blob_is_swept(tmp_path, monkeypatch):
+    store = main.BlobStore(str(tmp_path))
+    monkeypatch.setattr(main, 'blob_store', store)
+    ref = store.put('gone soon')
+    result = main.QuestionResult('run', 'c', '2026-01-01', 'Acme', 'q', 'A', response_refs={'chatgpt': ref})
+    assert result.response_text('chatgpt') == 'gone soon'
+    store.sweep(max_age=1e-9)
+    assert result.response_text('chatgpt') == ''
@@ -0,0 +1,50 @@
+import pytest
+import requests
+
+import main
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self._body = body or {}
+    
+    def json(self):
+        return self._body
+
+
+@pytest.fixture
+def brand_api(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, 'brand_cache', main.SQLiteCache(str(tmp_path / 'cache.sqlite3'), 'brand_assets', 3600, 100))
+    calls = []
+    outcomes = []
+    
+    def send(service, method, url, **kwargs):
+        calls.append(url)
+        outcome = outcomes.pop(0) if outcomes else FakeResponse(200, {'brand': {'domain': 'acme.com'}})
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+    
+    monkeypatch.setattr(main, 'send_with_retry', send)
+    return calls, outcomes
+
+
+def test_lookups_are_cached_per_normalized_domain(brand_api):
+    calls, _ = brand_api
+    first = main.get_parsed_brand_assets('https://www.Acme.com/about')
+    second = main.get_parsed_brand_assets('acme.com')
+    assert first == second
+    assert len(calls) == 1 and calls[0].endswith('domain=acme.com')
+    assert main.get_brand_assets('ACME.com') == {'brand': {'domain': 'acme.com'}}
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize('outcome', [FakeResponse(500), requests.ConnectionError('down')])
+def test_failed_lookups_degrade_and_are_not_cached(brand_api, outcome):
+    calls, outcomes = brand_api
+    outcomes.append(outcome)
+    assert main.get_parsed_brand_assets('acme.com')['primary_logo_url'] == ''
+    assert main.get_brand_assets('acme.com') == {'brand': {'domain': 'acme.com'}}
+    main.get_brand_assets('acme.com')
+    assert len(calls) == 2
@@ -0,0 +1,44 @@
+import main
+
+
+def make_cache(tmp_path, ttl=3600, max_entries=100):
+    return main.SQLiteCache(str(tmp_path / 'cache.sqlite3'), 'entries', ttl, max_entries)
+
+
+def test_round_trip_and_hit_rate(tmp_path):
+    cache = make_cache(tmp_path)
+    assert cache.get('k') is None
+    cache.set('k', {'answer': [1, 2]})
+    assert cache.get('k') == {'answer': [1, 2]}
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'hit_rate': 50.0, 'entries': 1}
+
+
+def test_expired_entries_are_misses_and_removed(tmp_path):
+    cache = make_cache(tmp_path, ttl=60)
+    cache.set('k', 'v')
+    cache._connect().execute("UPDATE entries SET created_at = created_at - 120")
+    assert cache.get('k') is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_eviction_keeps_the_most_recently_used_entries(tmp_path):
+    cache = make_cache(tmp_path, max_entries=16)  # evicts on every write
+    for i in range(16):
+        cache.set(f"k{i}", i)
+    cache._connect().execute("UPDATE entries SET accessed_at = accessed_at - 10")
+    assert cache.get('k0') == 0  # now the most recently used
+    cache.set('k16', 16)
+    
+    assert cache.stats()['entries'] == 16
+    assert cache.get('k0') == 0 and cache.get('k16') == 16
+    assert cache.get('k1') is None
+
+
+def test_invalidate_and_clear(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.invalidate('a')
+    assert cache.get('a') is None and cache.get('b') == 2
+    cache.clear()
+    assert cache.stats()['entries'] == 0
@@ -0,0 +1,23 @@
+import main
+
+
+def test_aho_corasick_finds_overlapping_patterns():
+    matcher = main.AhoCorasick(['he', 'she', 'his', 'hers'])
+    assert matcher.find('ushers') == {'she', 'he', 'hers'}
+    assert matcher.find('nothing here') == {'he'}
+    assert matcher.find('xyz') == set()
+
+
+def test_aho_corasick_ignores_empty_patterns():
+    assert main.AhoCorasick(['', 'ab']).find('cab') == {'ab'}
+
+
+def test_extract_maps_aliases_and_drops_placeholders():
+    index = main.CompetitorIndex(['Qualtrics'], 'Suzy', ['suzy insights'])
+    assert sorted(index.extract('qualtrics (XM); Suzy Insights, None, toluna')) == ['Qualtrics', 'Suzy', 'Toluna']
+    assert index.extract('') == []
+
+
+def test_count_mentions_counts_strings_not_occurrences():
+    counts = main.CompetitorIndex.count_mentions(['Zappi', 'Toluna'], ['zappi, Zappi', 'Toluna', 'zappi', ''])
+    assert counts == {'Zappi': 2, 'Toluna': 1}
@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+import main
+
+DAY = 86400
+
+
+def analysis(score, chatgpt=None, brand='Acme'):
+    return {'brand_name': brand, 'visibility_score': score, 'brand_coverage': 50,
+            'platforms_summary': {'chatgpt': {'score': score if chatgpt is None else chatgpt, 'mention': 1,
+                                              'sentiment': 1, 'recommendation': 1},
+                                  'gemini': {'score': 0, 'available': False}}}
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, 'HISTORY_PERIOD_DAYS', 30)
+    monkeypatch.setattr(main, 'TREND_THRESHOLD', 2)
+    return main.HistoryStore(str(tmp_path / 'history.sqlite3'))
+
+
+def test_store_opens_lazily(tmp_path):
+    main.HistoryStore(str(tmp_path / 'history.sqlite3'))
+    assert not os.listdir(tmp_path)
+
+
+def test_history_is_oldest_first_per_brand_and_skips_unavailable_platforms(store):
+    now = 1_800_000_000
+    for i, score in enumerate([40, 50, 60]):
+        store.record(analysis(score), f"R{i}", recorded_at=now + i * DAY)
+    store.record(analysis(90, brand='Globex'), 'G1', recorded_at=now)
+    
+    assert [p['score'] for p in store.history(' ACME ', until=now + 10 * DAY)] == [40, 50, 60]
+    assert [p['run_id'] for p in store.history('Acme', limit=2, until=now + 10 * DAY)] == ['R1', 'R2']
+    assert store.history('Acme', 'gemini', until=now + 10 * DAY) == []
+
+
+def test_rerecording_a_run_replaces_it(store):
+    store.record(analysis(40), 'R1', recorded_at=1_800_000_000)
+    store.record(analysis(45), 'R1', recorded_at=1_800_000_000)
+    assert [p['score'] for p in store.history('Acme', until=1_800_000_001)] == [45]
+
+
+def test_changes_report_trend_and_period_delta(store):
+    start = 1_800_000_000
+    store.record(analysis(30), 'R0', recorded_at=start)
+    store.record(analysis(50), 'R1', recorded_at=start + 20 * DAY)
+    store.record(analysis(51, chatgpt=45), 'R2', recorded_at=start + 31 * DAY)
+    
+    assert store.changes('Acme', 'all', 'R0') == {'trend': 'flat', 'delta': None, 'period_delta': None}
+    assert store.changes('Acme', 'all', 'R1') == {'trend': 'up', 'delta': 20.0, 'period_delta': None}
+    assert store.changes('Acme', 'all', 'R2') == {'trend': 'flat', 'delta': 1.0, 'period_delta': 21.0}
+    assert store.changes('Acme', 'chatgpt', 'R2')['trend'] == 'down'
+    assert store.changes('Acme', 'all', 'missing')['delta'] is None
@@ -0,0 +1,45 @@
+import pytest
+
+import main
+
+
+@pytest.fixture
+def resolver(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, 'industry_cache', main.SQLiteCache(str(tmp_path / 'cache.sqlite3'), 'industry', 3600, 100))
+    calls = []
+    fallback = []
+    
+    def resolve(brand_name, competitors, key_messages):
+        calls.append(brand_name)
+        return {'industry': 'Market research', 'valid_competitors': competitors, **({'fallback': True} if fallback else {})}
+    
+    monkeypatch.setattr(main, '_resolve_industry', resolve)
+    return calls, fallback
+
+
+def test_cache_key_ignores_order_case_whitespace_and_duplicates():
+    key = main.industry_cache_key('Acme', ['Globex', 'Initech'], ['fast insights'])
+    assert main.industry_cache_key(' acme ', ['initech', 'GLOBEX', 'Globex'], ['Fast  Insights']) == key
+    assert main.industry_cache_key('Acme', ['Globex'], ['fast insights']) != key
+
+
+def test_define_industry_is_memoized(resolver):
+    calls, _ = resolver
+    first = main.define_industry('Acme', ['Globex', 'Initech'], ['fast insights'])
+    assert main.define_industry('ACME', ['Initech', 'Globex'], ['Fast insights']) == first
+    assert len(calls) == 1
+    
+    main.define_industry('Acme', ['Globex', 'Initech'], ['fast insights'], refresh=True)
+    assert len(calls) == 2
+    main.invalidate_industry('Acme', ['Globex', 'Initech'], ['fast insights'])
+    main.define_industry('Acme', ['Globex', 'Initech'], ['fast insights'])
+    assert len(calls) == 3
+
+
+def test_fallback_results_are_not_cached(resolver):
+    calls, fallback = resolver
+    fallback.append(True)
+    assert main.define_industry('Acme', [], [])['fallback']
+    fallback.clear()
+    assert 'fallback' not in main.define_industry('Acme', [], [])
+    assert len(calls) == 2
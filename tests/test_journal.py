@@ -0,0 +1,88 @@
+import os
+import time
+import uuid
+
+import pytest
+
+import main
+
+
+@pytest.fixture
+def fake_providers(monkeypatch):
+    calls = []
+    failing = {'gemini'}
+    
+    def provider(name):
+        def query(question):
+            calls.append(name)
+            return 'Error: 500' if name in failing else f"{name} recommends Acme for {question}"
+        return query
+    
+    monkeypatch.setattr(main, 'PROVIDER_QUERIES', {p: provider(p) for p in main.PLATFORMS})
+    monkeypatch.setattr(main, 'RESPONSE_CACHE_ENABLED', False)
+    return calls, failing
+
+
+def run(questions, journal):
+    return list(main.iter_tracker_results(questions, 'Acme', [], [], journal.run_id, 'c', journal=journal))
+
+
+def test_journal_replay_restores_recorded_work():
+    run_id = f"test_{uuid.uuid4().hex}"
+    journal = main.RunJournal(run_id)
+    journal.record_run({'run_id': run_id})
+    journal.record_step('industry', {'industry': 'x'})
+    journal.record_response(0, 'chatgpt', 'hello')
+    journal.record_analysis(0, {'chatgpt': main.empty_platform_score()})
+    journal.record_airtable_batch(1, ['rec1'])
+    journal.close()
+    with open(journal.path, 'a') as f:
+        f.write('{"type": "response", "quest')  # torn final line from a crash
+    
+    replayed = main.RunJournal(run_id, resume=True)
+    replayed.close()
+    assert replayed.run == {'run_id': run_id}
+    assert replayed.steps == {'industry': {'industry': 'x'}}
+    assert replayed.responses == {0: {'chatgpt': 'hello'}}
+    assert 0 in replayed.analyses
+    assert replayed.airtable_batches == {1: ['rec1']}
+
+
+def test_resume_reuses_responses_and_does_not_requery_scored_questions(fake_providers):
+    calls, failing = fake_providers
+    questions = [{'text': 'q1', 'category': 'A'}, {'text': 'q2', 'category': 'A'}]
+    run_id = f"test_{uuid.uuid4().hex}"
+    journal = main.RunJournal(run_id)
+    first = run(questions, journal)
+    journal.close()
+    assert len(calls) == 8
+    
+    calls.clear()
+    failing.clear()
+    journal = main.RunJournal(run_id, resume=True)
+    resumed = run(questions, journal)
+    journal.close()
+    assert calls == []
+    assert [r.slim().scores for r in resumed] == [r.slim().scores for r in first]
+    assert resumed[0].score('gemini').notes.startswith('No response')
+
+
+def test_discard_deletes_the_journal():
+    journal = main.RunJournal(f"test_{uuid.uuid4().hex}")
+    journal.record_step('finished', True)
+    journal.discard()
+    assert not os.path.exists(journal.path)
+
+
+def test_prune_journals_removes_only_stale_journals(tmp_path):
+    stale = main.RunJournal('stale', directory=str(tmp_path))
+    stale.close()
+    fresh = main.RunJournal('fresh', directory=str(tmp_path))
+    fresh.close()
+    old = time.time() - 7200
+    os.utime(stale.path, (old, old))
+    
+    assert main.prune_journals(3600, directory=str(tmp_path)) == 1
+    assert not os.path.exists(stale.path)
+    assert os.path.exists(fresh.path)
+    assert main.prune_journals(0, directory=str(tmp_path)) == 0
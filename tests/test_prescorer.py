@@ -0,0 +1,29 @@
+import main
+
+
+def test_local_prescorer_mention_and_position():
+    prescorer = main.LocalPrescorer('Acme', ['Acme Corp'], ['Globex', 'Initech'])
+    first = prescorer.score('Acme Corp leads, then Globex.')
+    assert first['brand_mentioned'] and first['position'] == 100
+    assert first['competitors_mentioned'] == 'Globex'
+    assert prescorer.score('Globex, then acme.')['position'] == 75
+    assert prescorer.score('Globex and Initech, then acme.')['position'] == 50
+
+
+def test_local_prescorer_matches_whole_words_only():
+    prescorer = main.LocalPrescorer('Acme', competitors=['Globex'])
+    assert not prescorer.score('Only Globex here; acmeish does not count.')['brand_mentioned']
+
+
+def test_split_scorable_skips_absent_brand_and_errors():
+    prescorer = main.LocalPrescorer('Acme', competitors=['Globex'])
+    scored, skipped = main.split_scorable({
+        'chatgpt': 'Acme is best',
+        'claude': 'Globex is best',
+        'gemini': 'Error: 500',
+        'perplexity': f"{main.UNAVAILABLE_PREFIX} Perplexity circuit open",
+    }, prescorer)
+    assert list(scored) == ['chatgpt']
+    assert skipped['claude']['competitors_mentioned'] == 'Globex'
+    assert skipped['gemini']['notes'].startswith('No response')
+    assert skipped['perplexity']['available'] is False
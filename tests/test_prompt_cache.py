@@ -0,0 +1,33 @@
+from types import SimpleNamespace
+
+import pytest
+
+import main
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    requests = []
+    
+    def create_message(service, **kwargs):
+        requests.append(kwargs)
+        return SimpleNamespace(content=[SimpleNamespace(text='{}')])
+    
+    monkeypatch.setattr(main, 'create_message', create_message)
+    monkeypatch.setattr(main, 'rate_limiter', main.RateLimitScheduler({}))
+    return requests
+
+
+def test_prefix_is_sent_inline_by_default(sent):
+    main.claude_complete('QUESTION', 100, prefix='x' * 8000)
+    assert 'system' not in sent[0]
+    assert sent[0]['messages'][0]['content'].startswith('x' * 8000)
+
+
+def test_cache_flag_marks_only_prefixes_long_enough_to_be_cached(sent, monkeypatch):
+    monkeypatch.setattr(main, 'ANALYSIS_PROMPT_CACHE', True)
+    main.claude_complete('QUESTION', 100, prefix='short prefix')
+    main.claude_complete('QUESTION', 100, prefix='x' * 8000)
+    assert 'system' not in sent[0]
+    assert sent[1]['system'] == [{'type': 'text', 'text': 'x' * 8000, 'cache_control': {'type': 'ephemeral'}}]
+    assert sent[1]['messages'][0]['content'] == 'QUESTION'
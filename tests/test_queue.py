@@ -0,0 +1,76 @@
+import pytest
+
+import main
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return main.JobQueue(str(tmp_path / 'queue.sqlite3'))
+
+
+def test_claim_takes_oldest_job_once_and_counts_attempts(queue):
+    queue.enqueue({'run_id': 'R1'})
+    queue.enqueue({'run_id': 'R2'})
+    job_id, run, attempt = queue.claim()
+    assert run == {'run_id': 'R1'} and attempt == 1
+    assert queue.claim()[1] == {'run_id': 'R2'}
+    assert queue.claim() is None
+    
+    queue.finish(job_id, error='boom', requeue=True)
+    assert queue.claim()[1:] == ({'run_id': 'R1'}, 2)
+
+
+def test_finish_marks_done_or_failed(queue):
+    queue.enqueue({'run_id': 'R1'})
+    queue.enqueue({'run_id': 'R2'})
+    queue.finish(queue.claim()[0])
+    queue.finish(queue.claim()[0], error='boom')
+    assert queue.counts() == {'queued': 0, 'running': 0, 'done': 1, 'failed': 1}
+
+
+def test_requeue_worker_only_touches_the_dead_workers_jobs(queue, monkeypatch):
+    monkeypatch.setattr(main, 'QUEUE_MAX_ATTEMPTS', 2)
+    for run_id in ('R1', 'R2', 'R3'):
+        queue.enqueue({'run_id': run_id})
+    queue.claim(worker=101)
+    queue.claim(worker=202)
+    queue.claim(worker=101)
+    
+    assert queue.requeue_worker(101) == 2
+    assert queue.counts() == {'queued': 2, 'running': 1, 'done': 0, 'failed': 0}
+    
+    queue.claim(worker=101)
+    queue.claim(worker=101)
+    assert queue.requeue_worker(101) == 2  # second attempt each: out of attempts
+    assert queue.counts() == {'queued': 0, 'running': 1, 'done': 0, 'failed': 2}
+
+
+def test_requeue_running_recovers_interrupted_jobs(queue):
+    queue.enqueue({'run_id': 'R1'})
+    queue.claim()
+    assert queue.requeue_running() == 1
+    assert queue.depth() == 1
+
+
+def payload(**overrides):
+    data = {'brand_name': 'Acme', 'question_count': 1,
+            'questions': {'1': {'Questions Text': 'Best tool?', 'Questions Category': 'Awareness'}}}
+    return {**data, **overrides}
+
+
+def test_validate_webhook_input_accepts_a_well_formed_payload():
+    run = main.validate_webhook_input(payload())
+    assert run['brand_name'] == 'Acme'
+    assert run['questions'] == [{'text': 'Best tool?', 'category': 'Awareness'}]
+
+
+@pytest.mark.parametrize('data, message', [
+    ([], 'JSON object'),
+    (payload(brand_name=''), 'brand_name'),
+    (payload(question_count=0), 'at least one question'),
+    (payload(questions={'1': {'Questions Text': 'no category'}}), 'malformed'),
+    (payload(questions={'1': 'not a dict'}), 'malformed'),
+])
+def test_validate_webhook_input_rejects_bad_payloads(data, message):
+    with pytest.raises(ValueError, match=message):
+        main.validate_webhook_input(data)
@@ -0,0 +1,71 @@
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+import main
+
+
+@pytest.mark.parametrize('value, seconds', [
+    ('12', 12.0),
+    ('0.5', 0.5),
+    ('20ms', 0.02),
+    ('1m30s', 90.0),
+    ('2h', 7200.0),
+])
+def test_parse_reset_durations(value, seconds):
+    assert main._parse_reset(value) == pytest.approx(seconds)
+
+
+@pytest.mark.parametrize('value', ['', None, 'soon', '5 minutes'])
+def test_parse_reset_rejects_unknown_formats(value):
+    assert main._parse_reset(value) is None
+
+
+def test_parse_reset_dates():
+    later = datetime.now(timezone.utc) + timedelta(seconds=30)
+    assert main._parse_reset(later.isoformat()) == pytest.approx(30, abs=2)
+    assert main._parse_reset(format_datetime(later, usegmt=True)) == pytest.approx(30, abs=2)
+    assert main._parse_reset('2000-01-01T00:00:00Z') == 0.0
+
+
+def test_backoff_honors_retry_after_up_to_the_cap(monkeypatch):
+    monkeypatch.setattr(main, 'RETRY_MAX_DELAY', 10)
+    assert main.backoff_delay(0, 3.0) == 3.0
+    assert main.backoff_delay(0, 120.0) == 10
+    assert 0 <= main.backoff_delay(3) <= 8
+
+
+def test_token_bucket_allows_a_burst_then_paces():
+    bucket = main.TokenBucket(rate=50, capacity=5)
+    start = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    assert time.monotonic() - start < 0.05
+    for _ in range(5):
+        bucket.acquire()
+    assert time.monotonic() - start >= 0.08
+
+
+def test_token_bucket_block_for_holds_callers_back():
+    bucket = main.TokenBucket(rate=1000, capacity=10)
+    bucket.block_for(0.1)
+    start = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - start >= 0.09
+
+
+def test_scheduler_splits_limits_across_processes():
+    scheduler = main.RateLimitScheduler({'openai': {'rpm': 600, 'tpm': 60000}, 'gemini': {}}, share=4)
+    assert scheduler.request_buckets['openai'].rate == pytest.approx(600 / 4 / 60)
+    assert scheduler.token_buckets['openai'].capacity == 15000
+    assert 'gemini' not in scheduler.request_buckets
+
+
+def test_scheduler_pauses_a_provider_with_an_exhausted_quota():
+    scheduler = main.RateLimitScheduler({'openai': {'rpm': 6000}, 'claude': {'rpm': 6000}})
+    scheduler.observe('openai', {'x-ratelimit-remaining-requests': '0', 'x-ratelimit-reset-requests': '150ms'})
+    scheduler.observe('claude', {'anthropic-ratelimit-requests-remaining': '5', 'anthropic-ratelimit-requests-reset': '10s'})
+    assert scheduler.request_buckets['openai'].blocked_until > time.monotonic() + 0.1
+    assert scheduler.request_buckets['claude'].blocked_until == 0.0
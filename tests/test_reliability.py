@@ -0,0 +1,80 @@
+import time
+
+import pytest
+
+import main
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    breaker = main.CircuitBreaker('gemini', threshold=2, cooldown=0.05)
+    monkeypatch.setitem(main.circuit_breakers, 'gemini', breaker)
+    return breaker
+
+
+def test_circuit_opens_after_consecutive_failures(breaker):
+    for _ in range(2):
+        main.guarded_call('gemini', lambda q: 'Error: 500', 'q')
+    assert breaker.state == 'open'
+    assert main.is_unavailable_response(main.guarded_call('gemini', lambda q: 'fine', 'q'))
+
+
+def test_successful_probe_closes_circuit(breaker):
+    for _ in range(2):
+        main.guarded_call('gemini', lambda q: 'Error: 500', 'q')
+    time.sleep(0.06)
+    assert main.guarded_call('gemini', lambda q: 'fine', 'q') == 'fine'
+    assert breaker.state == 'closed'
+
+
+def test_raising_probe_does_not_leave_circuit_half_open(breaker):
+    def broken(question):
+        raise KeyError('candidates')
+    
+    for _ in range(2):
+        with pytest.raises(KeyError):
+            main.guarded_call('gemini', broken, 'q')
+    time.sleep(0.06)
+    with pytest.raises(KeyError):
+        main.guarded_call('gemini', broken, 'q')
+    time.sleep(0.06)
+    assert breaker.allow()
+
+
+@pytest.fixture
+def hedging(monkeypatch):
+    monkeypatch.setattr(main, 'HEDGE_ENABLED', True)
+    monkeypatch.setitem(main.provider_latency, 'gemini', main.LatencyTracker())
+    monkeypatch.setattr(main.provider_latency['gemini'], 'percentile', lambda pct: 0.01)
+    
+    def calls(*behaviours):
+        """query_fn whose n-th call sleeps, then returns or raises per behaviours[n]"""
+        queue = list(behaviours)
+        
+        def query(question):
+            delay, outcome = queue.pop(0)
+            time.sleep(delay)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+        return query
+    return calls
+
+
+def test_hedge_answers_when_the_first_call_raises_after_it_went_out(hedging):
+    query = hedging((0.05, RuntimeError('reset')), (0.15, 'hedged answer'))
+    assert main.hedged_call('gemini', query, 'q') == 'hedged answer'
+
+
+def test_hedge_prefers_a_good_answer_over_an_error_response(hedging):
+    query = hedging((0.05, 'Error: 500'), (0.1, 'hedged answer'))
+    assert main.hedged_call('gemini', query, 'q') == 'hedged answer'
+
+
+def test_hedged_call_raises_only_when_every_call_fails(hedging):
+    query = hedging((0.05, RuntimeError('first')), (0.1, KeyError('second')))
+    with pytest.raises((RuntimeError, KeyError)):
+        main.hedged_call('gemini', query, 'q')
+    
+    query = hedging((0.05, RuntimeError('first')), (0.1, 'Error: 503'))
+    assert main.hedged_call('gemini', query, 'q') == 'Error: 503'
@@ -0,0 +1,58 @@
+import threading
+import time
+
+import pytest
+
+import main
+
+
+def counter(name, provider):
+    return main.metrics.counters.get(main._metric_key(name, {'provider': provider}), 0)
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def test_concurrent_calls_share_one_execution_and_emit_metrics():
+    flights = main.SingleFlight('test_provider')
+    before = counter('singleflight_calls', 'test_provider'), counter('singleflight_coalesced', 'test_provider')
+    release = threading.Event()
+    executions = []
+    
+    def fetch():
+        executions.append(1)
+        release.wait(5)
+        return 'answer'
+    
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flights.do('q', fetch))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    wait_for(lambda: flights.leaders + flights.followers == 5)
+    release.set()
+    for thread in threads:
+        thread.join()
+    
+    assert results == ['answer'] * 5
+    assert len(executions) == 1
+    assert (flights.leaders, flights.followers) == (1, 4)
+    assert counter('singleflight_calls', 'test_provider') - before[0] == 5
+    assert counter('singleflight_coalesced', 'test_provider') - before[1] == 4
+
+
+def test_sequential_calls_and_failures_are_not_shared():
+    flights = main.SingleFlight('test_provider')
+    
+    def fail():
+        raise RuntimeError('boom')
+    
+    assert flights.do('q', lambda: 1) == 1
+    assert flights.do('q', lambda: 2) == 2
+    with pytest.raises(RuntimeError):
+        flights.do('q', fail)
+    assert flights.do('q', lambda: 3) == 3
+    assert flights.followers == 0
@@ -0,0 +1,31 @@
+import pytest
+
+import main
+
+
+def test_wilson_interval_contains_rate_and_narrows_with_samples():
+    low, high = main.wilson_interval(5, 10)
+    assert low < 0.5 < high
+    wide = high - low
+    low, high = main.wilson_interval(50, 100)
+    assert high - low < wide
+
+
+def test_wilson_interval_unanimous_and_empty():
+    low, high = main.wilson_interval(6, 6, 0.95)
+    assert high == pytest.approx(1.0)
+    assert high - low == pytest.approx(3.8415 / (6 + 3.8415), abs=1e-3)
+    assert main.wilson_interval(0, 0) == (0.0, 1.0)
+
+
+def test_z_value():
+    assert main.z_value(0.95) == pytest.approx(1.96, abs=1e-3)
+
+
+def test_score_table_interval_needs_two_scores():
+    results = [main.QuestionResult('r', 'c', 'd', 'Acme', f'q{i}', 'A',
+                                   {p: main.PlatformScore(overall=score) for p in main.PLATFORMS})
+               for i, score in enumerate([40, 60])]
+    low, high = main.ScoreTable(results).interval('chatgpt', 'overall')
+    assert low < 50 < high
+    assert main.ScoreTable(results[:1]).interval('chatgpt', 'overall') == [0, 100]